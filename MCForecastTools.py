@@ -1,13 +1,47 @@
 # Import libraries and dependencies
 import numpy as np
 import pandas as pd
-import os
-import datetime as dt
-import pytz
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from realestate_instrument import instrumented
+
+RETURN_MODELS = ("independent", "correlated", "bootstrap")
+
+# How the standard normal draws of the normal return models are taken
+SAMPLING_METHODS = ("random", "antithetic", "sobol")
+
+# Most dimensions scipy has Sobol direction numbers for (qmc.Sobol.MAXDIM);
+# Sobol sampling uses one dimension per month and county
+SOBOL_MAX_DIMENSION = 21201
+
+# Percentile bands and number of sample paths of the fan chart, and bins of the
+# final return histogram.  These fix the size of what the app draws, whatever
+# the number of simulations.
+FAN_CHART_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+FAN_CHART_PATHS = 5
+HISTOGRAM_BINS = 10
+
 
 class MCSimulation:
 
-    def __init__(self, pandas_df, weights="", num_simulations=1000, trading_months=12):
+    def __init__(self, pandas_df, weights="", num_simulations=1000, trading_months=12,
+                 streaming=False, chunk_size=1000, sample_paths=100, seed=None, n_workers=1,
+                 return_model="independent", sampling="random", control_variate=False,
+                 ci_batches=10):
+        if return_model not in RETURN_MODELS:
+            raise ValueError(f"return_model must be one of {RETURN_MODELS}, got {return_model!r}")
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError(f"sampling must be one of {SAMPLING_METHODS}, got {sampling!r}")
+        if sampling != "random" and return_model == "bootstrap":
+            raise ValueError("bootstrap resamples history and only supports sampling='random'")
+        if int(chunk_size) != chunk_size or chunk_size < 1:
+            raise ValueError(f"chunk_size must be a positive integer, got {chunk_size!r}")
+        if sampling == "antithetic" and chunk_size % 2:
+            # Pairs are drawn per chunk, so an odd chunk would split one
+            raise ValueError(f"sampling='antithetic' needs an even chunk_size, got {chunk_size}")
+
         pct_change_df = pandas_df.xs('value',level=1,axis=1).pct_change()
         locations = pandas_df.columns.get_level_values(0).unique()
         column_names = [(x,"monthly_return") for x in locations]
@@ -16,6 +50,11 @@ class MCSimulation:
         
         
         num_stocks = len(pandas_df.columns.get_level_values(0).unique())
+        if sampling == "sobol" and trading_months * num_stocks > SOBOL_MAX_DIMENSION:
+            raise ValueError(f"sampling='sobol' needs one dimension per month and county, "
+                             f"{trading_months} x {num_stocks} = {trading_months * num_stocks} is "
+                             f"more than the {SOBOL_MAX_DIMENSION} Sobol supports; use fewer "
+                             f"counties or months, or sampling='antithetic'")
         weights = [1.0/num_stocks for s in range(0,num_stocks)]
         
         
@@ -23,54 +62,319 @@ class MCSimulation:
         self.weights = weights
         self.nSim = num_simulations
         self.nTrading = trading_months
+        self.streaming = streaming
+        self.chunk_size = int(chunk_size)
+        self.sample_paths = sample_paths
+        self.seed = seed
+        self.n_workers = n_workers
+        self.return_model = return_model
+        self.sampling = sampling
+        self.control_variate = control_variate
+        self.ci_batches = ci_batches
         self.simulated_return = ""
+        self.final_returns = None
+        self.percentile_bands = None
+        self.fan_chart = None
+        self.final_histogram = None
+        self.mean_estimate = None
+        self.standard_errors = None
         
-    def calc_cumulative_return(self):
-        # Get closing prices of each stock
-        last_prices = self.df.xs('value',level=1,axis=1)[-1:].values.tolist()[0]
-        
-        # Calculate the mean and standard deviation of daily returns for each stock
-        monthly_returns = self.df.xs('monthly_return', level=1, axis=1)
-        mean_returns = monthly_returns.mean().tolist()
-        std_returns = monthly_returns.std().tolist()
-        print(mean_returns)
-        print(std_returns)
-
-        # Initialize empty Dataframe to hold simulated prices
-        portfolio_cumulative_returns = pd.DataFrame()
-
-        # Run the monte carlo simulation based on nSim
-        for n in range(self.nSim):
-            # Create a list of lists to contain the simulated values for each stock
-            simvals = [[p] for p in last_prices]
-            
-            # For each stock in our data:
-            for s in range(len(last_prices)):
+    @instrumented
+    def calc_cumulative_return(self, progress=None):
+        """
+        Runs the Monte Carlo simulation as a batched NumPy computation.
 
-                # Simulate the returns for each trading day
-                for i in range(self.nTrading):
-        
-                    # Calculate the simulated price using the last price within the list
-                    simvals[s].append(simvals[s][-1] * (1 + np.random.normal(mean_returns[s], std_returns[s])))
-                    
-            # Calculate the daily returns of simulated prices
-            sim_df = pd.DataFrame(simvals).T.pct_change()
-    
-            # Use the `dot` function with the weights to multiply weights with each column's simulated daily returns
-            sim_df = sim_df.dot(self.weights)
-    
-            # Calculate the normalized, cumulative return series
-            portfolio_cumulative_returns[n] = (1 + sim_df.fillna(0)).cumprod()
-        
-        # Set attribute to use in plotting
+        Monthly returns are drawn in chunks of `chunk_size` simulations as
+        (chunk, nTrading, nCounties) arrays, combined with the portfolio weights and
+        compounded with cumprod.  `return_model` selects how county returns are drawn:
+
+            independent - each county from its own normal distribution (default)
+            correlated - jointly normal, through the Cholesky factor of the
+                         covariance of the historical monthly returns
+            bootstrap - whole historical month-vectors resampled with replacement
+
+        `sampling` selects how the normal models draw their standard normals:
+
+            random - plain pseudo-random draws (default)
+            antithetic - every other simulation uses the negated draws of the
+                         one before it; needs an even `chunk_size` so no pair
+                         is split across chunks
+            sobol - scrambled Sobol points mapped through the normal inverse
+                    CDF (needs scipy); each of the `ci_batches` batches of
+                    simulations is one independently scrambled sequence,
+                    drawn in chunks like the other methods
+
+        With `control_variate` the mean final return is also estimated with
+        exp(sum of the monthly returns) as a control, whose lognormal mean is
+        known analytically, see `mean_estimate`.
+
+        The standard errors of the mean (batch means) and of both 95% confidence
+        interval bounds (delete-a-batch jackknife) are estimated from
+        `ci_batches` contiguous batches of simulations, see `standard_errors`.
+
+        Without a `seed` (and a single worker) the draws are
+        taken from the global `np.random` state in the same order as the original
+        per-simulation loop, so a fixed `np.random.seed` gives the same paths whatever
+        the chunk size.
+
+        With a `seed`, every chunk gets its own generator spawned from
+        `np.random.SeedSequence(seed)`, and with `n_workers` > 1 the chunks are run on
+        a process pool.  Results are bit-identical for the same seed and chunk size
+        whatever the number of workers.
+
+        In streaming mode only running percentile bands per month, the final
+        cumulative returns and a small reservoir sample of full paths are kept, so
+        peak memory is set by `chunk_size` rather than `num_simulations`.
+
+        Either way `fan_chart` (percentile bands and a few paths per month) and
+        `final_histogram` are filled in for drawing, see _summarize.
+
+        Parameters:
+            progress - optional function called as progress(done, total) with the
+                number of finished simulations after each chunk
+
+        Returns:
+            DataFrame of cumulative portfolio returns, one column per simulation
+            (only the sampled simulations in streaming mode)
+        """
+        if self.streaming:
+            return self._calc_streaming(progress)
+
+        # Fill one (nSim, nTrading + 1) array chunk by chunk
+        paths = np.empty((self.nSim, self.nTrading + 1))
+        start = 0
+        for chunk in self._simulate_chunks():
+            paths[start:start + len(chunk)] = chunk
+            start += len(chunk)
+            if progress is not None:
+                progress(start, self.nSim)
+        controls = _control_values(paths) if self.control_variate else None
+
+        # Set attribute to use in plotting, one column per simulation
+        portfolio_cumulative_returns = pd.DataFrame(paths.T)
         self.simulated_return = portfolio_cumulative_returns
-        
+        self.final_returns = portfolio_cumulative_returns.iloc[-1, :]
+
         # Calculate 95% confidence intervals for final cumulative returns
-        self.confidence_interval = portfolio_cumulative_returns.iloc[-1, :].quantile(q=[0.025, 0.975])
-        
+        self.confidence_interval = self.final_returns.quantile(q=[0.025, 0.975])
+
+        bands = pd.DataFrame(np.quantile(paths, FAN_CHART_QUANTILES, axis=0).T,
+                             columns=FAN_CHART_QUANTILES)
+        self._summarize(bands)
+        self._estimate_errors(controls)
+
         return portfolio_cumulative_returns
-        
-    
+
+    def _calc_streaming(self, progress=None):
+        """
+        Streaming variant of calc_cumulative_return that never holds every path.
+        """
+        bands = _MonthlyHistogram(self.nTrading + 1)
+        reservoir = _PathReservoir(self.sample_paths, self.nTrading + 1,
+                                   np.random.default_rng(self._seed_sequence().spawn(1)[0]))
+        final_returns = np.empty(self.nSim)
+        controls = np.empty(self.nSim) if self.control_variate else None
+
+        start = 0
+        for chunk in self._simulate_chunks():
+            bands.update(chunk)
+            reservoir.update(chunk)
+            final_returns[start:start + len(chunk)] = chunk[:, -1]
+            if controls is not None:
+                controls[start:start + len(chunk)] = _control_values(chunk)
+            start += len(chunk)
+            if progress is not None:
+                progress(start, self.nSim)
+
+        # Approximate percentile bands per month, e.g. for fan charts
+        self.percentile_bands = bands.quantiles([0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975])
+
+        # Set attribute to use in plotting, one column per sampled simulation
+        self.simulated_return = pd.DataFrame(reservoir.paths().T, columns=reservoir.indices())
+        self.final_returns = pd.Series(final_returns, name=self.nTrading)
+
+        # Calculate 95% confidence intervals for final cumulative returns
+        self.confidence_interval = self.final_returns.quantile(q=[0.025, 0.975])
+
+        self._summarize(self.percentile_bands[FAN_CHART_QUANTILES])
+        self._estimate_errors(controls)
+
+        return self.simulated_return
+
+    def _summarize(self, bands):
+        """
+        Precomputes the fan chart and the final return histogram the app draws
+        instead of every simulated path.
+
+        Parameters:
+            bands - DataFrame indexed by month with one column per quantile of
+                FAN_CHART_QUANTILES
+        """
+        # Percentile bands per month, labelled '5%' ... '95%', and a few paths
+        fan_chart = bands.rename(columns=lambda q: f'{q:.0%}')
+        sample = self.simulated_return.iloc[:, :FAN_CHART_PATHS]
+        for i in range(sample.shape[1]):
+            fan_chart[f'path {i + 1}'] = sample.iloc[:, i].to_numpy()
+        fan_chart.index.name = 'month'
+        self.fan_chart = fan_chart
+
+        # Histogram of the final cumulative returns, binned once
+        counts, edges = np.histogram(self.final_returns.to_numpy(), bins=HISTOGRAM_BINS)
+        self.final_histogram = pd.DataFrame({
+            'lower': edges[:-1],
+            'upper': edges[1:],
+            'count': counts,
+            'density': counts / (counts.sum() * np.diff(edges)),
+        })
+
+    def _estimate_errors(self, controls=None):
+        """
+        Estimates the mean final return and the standard errors of the mean and
+        of the 95% confidence interval bounds from `ci_batches` batches.
+
+        Parameters:
+            controls - per-simulation values of the control variate, or None
+        """
+        final_returns = self.final_returns.to_numpy()
+        mean_estimate = final_returns.mean()
+        adjusted = final_returns
+        if controls is not None:
+            # Regression-adjusted estimate: Y - b (C - E[C]) with b = cov(Y, C) / var(C)
+            control_mean = _control_mean(self._simulation_params())
+            variance = controls.var()
+            slope = np.mean((final_returns - mean_estimate) * (controls - controls.mean())) / variance \
+                if variance > 0 else 0.0
+            adjusted = final_returns - slope * (controls - control_mean)
+            mean_estimate = adjusted.mean()
+        self.mean_estimate = mean_estimate
+
+        # Batch means for the mean.  Tail quantiles of small batches are
+        # biased, so the interval bounds use a delete-a-batch jackknife instead.
+        bounds = self._batch_bounds()
+        batches = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+                   if stop > start]
+        errors = np.full(3, np.nan)
+        if len(batches) > 1:
+            batch_means = np.array([adjusted[batch].mean() for batch in batches])
+            errors[0] = batch_means.std(ddof=1) / np.sqrt(len(batches))
+            jackknife = np.array([
+                np.quantile(np.delete(final_returns, batch), [0.025, 0.975]) for batch in batches])
+            errors[1:] = np.sqrt((len(batches) - 1) / len(batches)
+                                 * ((jackknife - jackknife.mean(axis=0)) ** 2).sum(axis=0))
+        self.standard_errors = pd.Series(errors, index=["Mean", "95% CI Lower", "95% CI Upper"])
+
+    def _batch_bounds(self):
+        """
+        Boundaries of the `ci_batches` contiguous batches of simulations the
+        standard errors are estimated from.  Antithetic pairs are never split
+        across batches.
+        """
+        batches = max(1, min(self.ci_batches, self.nSim))
+        bounds = np.linspace(0, self.nSim, batches + 1).astype(np.int64)
+        if self.sampling == "antithetic":
+            bounds[1:-1] -= bounds[1:-1] % 2
+        return bounds
+
+    def _seed_sequence(self):
+        """
+        Root SeedSequence for this simulation.  The first spawned child seeds the
+        path reservoir, the following ones seed each chunk of simulations.
+        """
+        return np.random.SeedSequence(self.seed)
+
+    def _simulation_params(self):
+        """
+        Collects the inputs the simulation workers need into a picklable dict.
+        """
+        # Calculate the mean and standard deviation of monthly returns for each county
+        monthly_returns = self.df.xs('monthly_return', level=1, axis=1)
+        params = {
+            "return_model": self.return_model,
+            "mean_returns": monthly_returns.mean().values,
+            "std_returns": monthly_returns.std().values,
+            "weights": np.asarray(self.weights, dtype=float),
+            "trading_months": self.nTrading,
+            "sampling": self.sampling,
+        }
+
+        if self.return_model == "correlated":
+            params["covariance_factor"] = _covariance_factor(monthly_returns.cov().values)
+        elif self.return_model == "bootstrap":
+            # Only months where every county has a return can be resampled as a whole
+            history = monthly_returns.dropna(how='any').values
+            if len(history) == 0:
+                raise ValueError("bootstrap needs at least one month with returns for every county")
+            params["history"] = history
+
+        return params
+
+    def _simulate_chunks(self):
+        """
+        Yields cumulative return paths for consecutive chunks of `chunk_size` simulations.
+        """
+        params = self._simulation_params()
+        if self.sampling == "sobol":
+            yield from self._simulate_sobol_chunks(params)
+            return
+
+        chunk_sizes = [min(self.chunk_size, self.nSim - start)
+                       for start in range(0, self.nSim, self.chunk_size)]
+
+        # Legacy path: draw from the global random state in simulation order
+        if self.seed is None and self.n_workers == 1:
+            for num_simulations in chunk_sizes:
+                yield _simulate_chunk(params, num_simulations)
+            return
+
+        # One independent generator per chunk, regardless of which worker runs it
+        root = self._seed_sequence()
+        root.spawn(1)
+        chunk_seeds = root.spawn(len(chunk_sizes))
+        tasks = [(params, n, seed) for n, seed in zip(chunk_sizes, chunk_seeds)]
+        yield from self._run_tasks(tasks)
+
+    def _simulate_sobol_chunks(self, params):
+        """
+        Sobol variant of _simulate_chunks.  Every batch of simulations is one
+        independently scrambled sequence, drawn in chunks of `chunk_size` points
+        one after another, so the paths do not depend on the chunk size.
+        """
+        batch_sizes = [int(size) for size in np.diff(self._batch_bounds()) if size > 0]
+        if self.seed is None and self.n_workers == 1:
+            # Each batch is scrambled with a seed drawn from the global random state
+            batch_seeds = None
+        else:
+            root = self._seed_sequence()
+            root.spawn(1)
+            batch_seeds = root.spawn(len(batch_sizes))
+
+        tasks = []
+        for batch, size in enumerate(batch_sizes):
+            for offset in range(0, size, self.chunk_size):
+                seed = None if batch_seeds is None else batch_seeds[batch]
+                tasks.append((params, min(self.chunk_size, size - offset), None, (seed, offset)))
+
+        if batch_seeds is None:
+            for _, n, _, (_, offset) in tasks:
+                if offset == 0:
+                    seed = np.random.randint(0, 2 ** 31)
+                yield _simulate_chunk(params, n, None, (seed, offset))
+            return
+        yield from self._run_tasks(tasks)
+
+    def _run_tasks(self, tasks):
+        """
+        Runs _simulate_chunk tasks in order, on a process pool with `n_workers` > 1.
+        """
+        if self.n_workers == 1:
+            for task in tasks:
+                yield _simulate_chunk(*task)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            yield from _ordered_pool_map(pool, _simulate_chunk, tasks, 2 * self.n_workers)
+
+    @instrumented
     def plot_simulation(self):
         """
         Visualizes the simulated stock trajectories using calc_cumulative_return method.
@@ -84,6 +388,7 @@ class MCSimulation:
         plot_title = f"{self.nSim} Simulations of Cumulative Portfolio Return Trajectories Over the Next {self.nTrading} Trading Months."
         return self.simulated_return.plot(legend=None,title=plot_title)
         
+    @instrumented
     def plot_distribution(self):
         """
         Visualizes the distribution of cumulative returns simulated using calc_cumulative_return method.
@@ -96,11 +401,12 @@ class MCSimulation:
         # Use the `plot` function to create a probability distribution histogram of simulated ending prices
         # with markings for a 95% confidence interval
         plot_title = f"Distribution of Final Cumuluative Returns Across All {self.nSim} Simulations"
-        plt = self.simulated_return.iloc[-1, :].plot(kind='hist', bins=10,density=True,title=plot_title)
+        plt = self.final_returns.plot(kind='hist', bins=10,density=True,title=plot_title)
         plt.axvline(self.confidence_interval.iloc[0], color='r')
         plt.axvline(self.confidence_interval.iloc[1], color='r')
         return plt
         
+    @instrumented
     def summarize_cumulative_return(self):
         """
         Calculate final summary statistics for Monte Carlo simulated stock data.
@@ -111,7 +417,369 @@ class MCSimulation:
         if not isinstance(self.simulated_return,pd.DataFrame):
             self.calc_cumulative_return()
             
-        metrics = self.simulated_return.iloc[-1].describe()
+        metrics = self.final_returns.describe()
         ci_series = self.confidence_interval
         ci_series.index = ["95% CI Lower","95% CI Upper"]
-        return metrics.append(ci_series)
+        errors = self.standard_errors.rename(lambda name: f"{name} SE")
+        summary = [metrics, ci_series, errors]
+        if self.control_variate:
+            summary.insert(1, pd.Series({"Mean (control variate)": self.mean_estimate}))
+        return pd.concat(summary)
+
+
+def _simulate_chunk(params, num_simulations, seed_sequence=None, sobol=None):
+    """
+    Simulates one chunk of cumulative portfolio return paths.
+
+    Parameters:
+        params - dict built by MCSimulation._simulation_params
+        num_simulations - number of simulations in this chunk
+        seed_sequence - SeedSequence for this chunk, or None to use the global random state
+        sobol - for Sobol sampling, (seed, offset) of the chunk: the seed (an int
+            or SeedSequence) scrambles the sequence of its batch and the chunk
+            takes the points from offset on
+
+    Returns:
+        ndarray of shape (num_simulations, trading_months + 1)
+    """
+    rng = np.random if seed_sequence is None else np.random.default_rng(seed_sequence)
+    shape = (num_simulations, params["trading_months"])
+    weights = params["weights"]
+
+    if params["return_model"] == "correlated":
+        # Joint draw mean + L z per month; only its weighted sum is needed, so fold the
+        # weights into the factor: w . (mean + L z) = w . mean + z . (L^T w)
+        z = _standard_normal(rng, shape + (len(weights),), params["sampling"], sobol)
+        portfolio_returns = params["mean_returns"] @ weights + z @ (params["covariance_factor"].T @ weights)
+    elif params["return_model"] == "bootstrap":
+        # Resample historical month-vectors, pre-weighted into portfolio returns
+        history = params["history"] @ weights
+        portfolio_returns = history[_random_integers(rng, len(history), shape)]
+    else:
+        returns = _draw_normal_returns(params["mean_returns"], params["std_returns"],
+                                       num_simulations, params["trading_months"], rng,
+                                       params["sampling"], sobol)
+        portfolio_returns = returns @ weights
+
+    return _cumulative_paths(portfolio_returns)
+
+
+def _ordered_pool_map(pool, fn, tasks, window):
+    """
+    Runs `fn(*task)` on the pool and yields results in task order, keeping at most
+    `window` tasks in flight so finished chunks do not pile up in memory.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _draw_normal_returns(mean_returns, std_returns, num_simulations, trading_months, rng=np.random,
+                         sampling="random", sobol=None):
+    """
+    Draws independent normal monthly returns for every simulation, month and county.
+
+    The standard normal draws are taken in (simulation, county, month) order, which is
+    the order the original nested loops consumed the global random state in, and then
+    transposed to (simulation, month, county).  `rng` is either the `np.random`
+    module or a `np.random.Generator`.
+
+    Returns:
+        ndarray of shape (num_simulations, trading_months, num_counties)
+    """
+    num_counties = len(mean_returns)
+    z = _standard_normal(rng, (num_simulations, num_counties, trading_months), sampling, sobol)
+    return mean_returns + std_returns * z.transpose(0, 2, 1)
+
+
+def _standard_normal(rng, shape, sampling="random", sobol=None):
+    """
+    Standard normal draws of shape (num_simulations, ...) for a sampling method.
+
+    random draws straight from `rng`, so the draws are unchanged from before
+    sampling methods existed.  antithetic draws half as many and interleaves
+    each draw with its negation.  sobol maps one scrambled Sobol point per
+    simulation, with one dimension per month and county, through the normal
+    inverse CDF; `sobol` is the (seed, offset) of the points, see _sobol_points.
+    """
+    if sampling == "random":
+        return rng.standard_normal(shape)
+
+    num_simulations, rest = shape[0], shape[1:]
+    if sampling == "antithetic":
+        half = rng.standard_normal(((num_simulations + 1) // 2,) + rest)
+        z = np.empty((2 * len(half),) + rest)
+        z[0::2] = half
+        z[1::2] = -half
+        return z[:num_simulations]
+
+    # scipy is optional and only needed for Sobol sampling
+    try:
+        from scipy.special import ndtri
+    except ImportError:
+        raise ImportError("sampling='sobol' needs scipy") from None
+
+    seed, offset = sobol
+    points = _sobol_points(seed, offset, int(np.prod(rest)), num_simulations)
+    # Scrambled points are never exactly 0, but keep ppf finite regardless
+    points = np.clip(points, np.finfo(float).tiny, 1 - np.finfo(float).eps)
+    return ndtri(points).reshape(shape)
+
+
+# Per-thread (key, engine) of the scrambled Sobol sequence drawn from last, kept
+# so the chunks of a batch continue one sequence instead of scrambling it again.
+# Per thread, so simulations running at the same time on the background job
+# threads never draw from each other's engines.
+_sobol = threading.local()
+
+
+def _sobol_points(seed, offset, dimension, num_points):
+    """
+    Points offset .. offset + num_points of the scrambled Sobol sequence of a seed.
+
+    The engine of the last seed is kept per thread, so consecutive chunks of
+    a batch draw on from where the previous one stopped; any other offset is
+    reached with reset and fast_forward.
+
+    Parameters:
+        seed - int or SeedSequence the sequence is scrambled with
+        offset - index of the first point
+        dimension - dimension of the points
+        num_points - number of points
+
+    Returns:
+        ndarray of shape (num_points, dimension)
+    """
+    from scipy.stats import qmc
+
+    if isinstance(seed, np.random.SeedSequence):
+        key = (seed.entropy, seed.spawn_key, dimension)
+        seed = np.random.default_rng(seed)
+    else:
+        key = (seed, dimension)
+    cached = getattr(_sobol, 'engine', None)
+    if cached is None or cached[0] != key:
+        cached = _sobol.engine = (key, qmc.Sobol(d=dimension, scramble=True, seed=seed))
+    engine = cached[1]
+    if engine.num_generated != offset:
+        engine.reset()
+        engine.fast_forward(offset)
+
+    with warnings.catch_warnings():
+        # Sobol points are best balanced in powers of two, but any prefix of a
+        # scrambled sequence is still a valid randomized QMC sample
+        warnings.simplefilter("ignore", UserWarning)
+        return engine.random(num_points)
+
+
+def _control_values(paths):
+    """
+    Control variate of each simulated path: exp of the sum of its monthly
+    returns, which is lognormal for the normal return models.
+    """
+    returns = paths[:, 1:] / paths[:, :-1] - 1
+    return np.exp(returns.sum(axis=1))
+
+
+def _control_mean(params):
+    """
+    Analytic mean of the control variate, E[exp(sum of the monthly portfolio returns)].
+
+    The monthly portfolio returns are independent across months, so for the
+    normal models their sum over T months is normal with mean T m and variance
+    T v, whose exponential has mean exp(T m + T v / 2).  Bootstrapped months are
+    drawn uniformly from history, giving mean(exp(r))^T.
+    """
+    weights = params["weights"]
+    months = params["trading_months"]
+    if params["return_model"] == "bootstrap":
+        return np.mean(np.exp(params["history"] @ weights)) ** months
+
+    mean = params["mean_returns"] @ weights
+    if params["return_model"] == "correlated":
+        variance = np.sum((params["covariance_factor"].T @ weights) ** 2)
+    else:
+        variance = (params["std_returns"] ** 2) @ (weights ** 2)
+    return np.exp(months * mean + months * variance / 2)
+
+
+def _random_integers(rng, high, size):
+    """
+    Uniform integers in [0, high) from either the `np.random` module or a Generator.
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(0, high, size)
+    return rng.randint(0, high, size)
+
+
+def _covariance_factor(covariance):
+    """
+    Returns a matrix L with L @ L.T equal to the covariance matrix.
+
+    Uses the Cholesky factor when the matrix is positive definite.  Pairwise
+    covariances of counties with different histories, or perfectly correlated
+    counties, can make it only semi-definite, in which case negative eigenvalues
+    are clipped to zero and L = V sqrt(diag(eigenvalues)) is used instead.
+    """
+    covariance = np.nan_to_num(covariance)
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+def _cumulative_paths(portfolio_returns):
+    """
+    Turns simulated monthly portfolio returns into cumulative return paths.
+
+    Parameters:
+        portfolio_returns - ndarray of shape (num_simulations, trading_months)
+
+    Returns:
+        ndarray of shape (num_simulations, trading_months + 1), starting at 1.0
+    """
+    paths = np.ones((portfolio_returns.shape[0], portfolio_returns.shape[1] + 1))
+    np.cumprod(1 + portfolio_returns, axis=1, out=paths[:, 1:])
+    return paths
+
+
+class _MonthlyHistogram:
+    """
+    Running fixed-bin histogram per month, used to estimate percentile bands
+    without keeping every simulated path.
+
+    Bin edges are set from the first chunk, padded on both sides by the observed
+    range.  When a later chunk falls outside a month's range, that month's bins
+    are doubled in width (merging pairs of bins) until the range covers it, so
+    no value is ever clipped into an edge bin whatever the chunk size.  Exact
+    minimum and maximum are tracked so estimates never leave the observed range.
+    With the default 2000 bins the range is at most a few times the spread of
+    the values, so the quantile error is a fraction of a percent of it.
+    """
+
+    def __init__(self, num_months, num_bins=2000):
+        # Bins are merged in pairs when the range grows
+        if num_bins % 2:
+            raise ValueError(f"num_bins must be even, got {num_bins}")
+        self.num_bins = num_bins
+        self.counts = np.zeros((num_months, num_bins), dtype=np.int64)
+        self.lower = None
+        self.width = None
+        self.minimum = np.full(num_months, np.inf)
+        self.maximum = np.full(num_months, -np.inf)
+
+    def update(self, paths):
+        """
+        Adds a (num_simulations, num_months) chunk of paths to the histogram.
+        """
+        values = paths.T
+        low = values.min(axis=1)
+        high = values.max(axis=1)
+        if self.lower is None:
+            pad = high - low
+            self.lower = low - pad
+            # Months where every path is equal (e.g. month 0) still need a positive width
+            self.width = np.maximum(3 * pad, 1e-12) / self.num_bins
+        else:
+            self._grow(low, high)
+
+        self.minimum = np.minimum(self.minimum, low)
+        self.maximum = np.maximum(self.maximum, high)
+
+        bins = ((values - self.lower[:, None]) / self.width[:, None]).astype(np.int64)
+        # Only float round-off at the edges can land outside the bins
+        np.clip(bins, 0, self.num_bins - 1, out=bins)
+        bins += np.arange(len(values))[:, None] * self.num_bins
+        self.counts += np.bincount(bins.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def _grow(self, low, high):
+        """
+        Widens the range of every month that does not cover [low, high].
+
+        Each step doubles the bin width: pairs of bins are merged and the freed
+        half of the bins is added below the range when values fall below it,
+        above it otherwise.  The old edges stay edges, so counts are never split.
+        """
+        half = self.num_bins // 2
+        upper = self.lower + self.num_bins * self.width
+        for month in np.flatnonzero((low < self.lower) | (high > upper)):
+            counts = self.counts[month]
+            while (low[month] < self.lower[month]
+                   or high[month] > self.lower[month] + self.num_bins * self.width[month]):
+                merged = counts.reshape(half, 2).sum(axis=1)
+                counts = np.zeros_like(counts)
+                if low[month] < self.lower[month]:
+                    self.lower[month] -= self.num_bins * self.width[month]
+                    counts[half:] = merged
+                else:
+                    counts[:half] = merged
+                self.width[month] *= 2
+            self.counts[month] = counts
+
+    def quantiles(self, q):
+        """
+        Estimates quantiles per month by interpolating within the histogram bins.
+
+        Returns:
+            DataFrame indexed by month with one column per quantile
+        """
+        cumulative = np.cumsum(self.counts, axis=1)
+        total = cumulative[:, -1]
+        estimates = {}
+        for quantile in q:
+            target = quantile * total
+            bin_index = np.array([np.searchsorted(row, t) for row, t in zip(cumulative, target)])
+            bin_index = np.minimum(bin_index, self.num_bins - 1)
+            months = np.arange(len(total))
+            below = np.where(bin_index > 0, cumulative[months, bin_index - 1], 0)
+            in_bin = np.maximum(self.counts[months, bin_index], 1)
+            fraction = (target - below) / in_bin
+            value = self.lower + (bin_index + fraction) * self.width
+            estimates[quantile] = np.clip(value, self.minimum, self.maximum)
+        return pd.DataFrame(estimates)
+
+
+class _PathReservoir:
+    """
+    Uniform reservoir sample (Algorithm R) of full simulated paths.
+
+    Uses its own generator so sampling does not shift the simulation draws.
+    """
+
+    def __init__(self, size, num_months, rng):
+        self.size = size
+        self.seen = 0
+        self.samples = np.empty((size, num_months))
+        self.sample_index = np.empty(size, dtype=np.int64)
+        self.rng = rng
+
+    def update(self, paths):
+        """
+        Offers a chunk of paths to the reservoir.
+        """
+        index = np.arange(self.seen, self.seen + len(paths))
+        self.seen += len(paths)
+
+        # Fill the reservoir first
+        fill = index < self.size
+        self.samples[index[fill]] = paths[fill]
+        self.sample_index[index[fill]] = index[fill]
+
+        # Then replace slot j with probability size / (i + 1)
+        rest = np.flatnonzero(~fill)
+        if len(rest):
+            slots = (self.rng.random(len(rest)) * (index[rest] + 1)).astype(np.int64)
+            keep = slots < self.size
+            self.samples[slots[keep]] = paths[rest[keep]]
+            self.sample_index[slots[keep]] = index[rest[keep]]
+
+    def paths(self):
+        return self.samples[:min(self.seen, self.size)]
+
+    def indices(self):
+        return self.sample_index[:min(self.seen, self.size)]
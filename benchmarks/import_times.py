@@ -0,0 +1,172 @@
+"""
+Import-time profile of the app's modules and their heavy dependencies.
+
+Every target is imported in a fresh interpreter, the way a cold Streamlit
+container or a spawned worker process imports it, with `python -X importtime`.
+Reports the wall time of the import (interpreter start-up excluded) and the
+slowest modules it pulled in.  Targets that are not installed are skipped.
+
+Results are written as JSON; pass an earlier results file to --compare to
+print the change of every target against it.  Usage:
+
+    python benchmarks/import_times.py
+    python benchmarks/import_times.py --targets realestate_data,macd --top 10
+"""
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# What the app imports before drawing its first section
+APP_IMPORTS = ['streamlit', 'numpy', 'realestate_access', 'realestate_instrument',
+               'realestate_jobs', 'realestate_map', 'macd']
+
+# Label -> modules imported together in one interpreter
+DEFAULT_TARGETS = {
+    'app': APP_IMPORTS,
+    'realestate_data': ['realestate_data'],
+    'realestate_access': ['realestate_access'],
+    'macd': ['macd'],
+    'MCForecastTools': ['MCForecastTools'],
+    'realestate_forecast': ['realestate_forecast'],
+    'pandas': ['pandas'],
+    'streamlit': ['streamlit'],
+    'pydeck': ['pydeck'],
+    'hvplot': ['holoviews', 'hvplot.pandas'],
+    'matplotlib': ['matplotlib.pyplot'],
+    'pandas_ta': ['pandas_ta'],
+    'nasdaqdatalink': ['nasdaqdatalink'],
+    'scipy.spatial': ['scipy.spatial'],
+}
+
+
+def _run(code, importtime=False):
+    """
+    Runs Python code in a fresh interpreter from the repository root.
+
+    Returns:
+        tuple of (wall seconds, completed process)
+    """
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    return time.perf_counter() - start, process
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output.
+
+    Returns:
+        list of (module, self seconds, cumulative seconds, depth) in the order
+        the imports finished
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return rows
+
+
+def profile_target(modules, repeat=3, top=5):
+    """
+    Profiles importing a set of modules in fresh interpreters.
+
+    Parameters:
+        modules - list of module names imported together
+        repeat - number of interpreters timed; the fastest is reported
+        top - number of slowest imported modules reported
+
+    Returns:
+        dict with seconds (wall time minus interpreter start-up), the
+        importtime total and the `top` slowest modules by self time, or with
+        an error when the import failed
+    """
+    code = '; '.join(f'import {module}' for module in modules)
+    baseline = min(_run('pass')[0] for _ in range(repeat))
+    seconds = []
+    for _ in range(repeat):
+        elapsed, process = _run(code)
+        if process.returncode != 0:
+            return {'modules': modules, 'error': process.stderr.strip().splitlines()[-1]}
+        seconds.append(elapsed - baseline)
+
+    # Modules the interpreter imports on start-up are left out of the totals
+    startup = {row[0] for row in parse_importtime(_run('pass', importtime=True)[1].stderr)}
+    rows = [row for row in parse_importtime(_run(code, importtime=True)[1].stderr)
+            if row[0] not in startup]
+    imported = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        'modules': modules,
+        'seconds': min(seconds),
+        'median_seconds': statistics.median(seconds),
+        'importtime_seconds': imported,
+        'slowest': [{'module': name, 'self_seconds': self_seconds}
+                    for name, self_seconds, _, _ in slowest],
+    }
+
+
+def compare(previous, current):
+    """
+    Prints the import time of every target against a previous run.
+    """
+    for label, result in current['targets'].items():
+        old = previous['targets'].get(label)
+        if old is None or 'seconds' not in old or 'seconds' not in result:
+            continue
+        before, after = old['seconds'], result['seconds']
+        print(f'  {label:22s} {before * 1000:8.1f} ms -> {after * 1000:8.1f} ms'
+              f'  ({after / before:5.2f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile the import time of the app modules.')
+    parser.add_argument('--targets', help='comma-separated labels or module names, '
+                        f'default {",".join(DEFAULT_TARGETS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='interpreters timed per target')
+    parser.add_argument('--top', type=int, default=5, help='slowest modules listed per target')
+    parser.add_argument('--output', help='results file, default results/imports-<timestamp>.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    labels = args.targets.split(',') if args.targets else list(DEFAULT_TARGETS)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'targets': {},
+    }
+    for label in labels:
+        result = profile_target(DEFAULT_TARGETS.get(label, [label]), args.repeat, args.top)
+        report['targets'][label] = result
+        if 'error' in result:
+            print(f'{label:22s} skipped: {result["error"]}')
+            continue
+        slowest = ', '.join(f"{row['module']} {row['self_seconds'] * 1000:.0f}"
+                            for row in result['slowest'])
+        print(f"{label:22s} {result['seconds'] * 1000:8.1f} ms   slowest (ms): {slowest}")
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"imports-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
@@ -0,0 +1,227 @@
+"""
+Offline benchmarks for the data loading, statistics, MACD and Monte Carlo code.
+
+Each scale writes a synthetic dataset (see synthetic_zillow.py) to a
+temporary directory, serves the regions through LocalZillowClient and times
+the app's functions against it.  No API key or Zillow export is needed.
+
+Results are written as JSON; pass an earlier results file to --compare to
+print the change of every timing against it.  Usage:
+
+    python benchmarks/run_benchmarks.py --scales 300x120,3143x308 --compare old.json
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import macd
+import realestate_cache
+import realestate_data as red
+import realestate_stats as res
+from MCForecastTools import MCSimulation
+from realestate_jobs import monte_carlo_input
+from realestate_panel import ValuePanel
+
+import synthetic_zillow
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+DEFAULT_SCALES = '300x120,1000x240,3143x308'
+
+
+def time_call(fn, repeat=3, setup=None):
+    """
+    Times a function call.
+
+    Parameters:
+        fn - function called without arguments
+        repeat - number of timed calls
+        setup - function called before each timed call and not timed, e.g.
+            to clear a cache
+
+    Returns:
+        dict with min, median and max seconds and the number of calls
+    """
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return {
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+        'max': max(seconds),
+        'repeat': repeat,
+    }
+
+
+def _clear_disk_cache():
+    shutil.rmtree(realestate_cache.CACHE_DIR, ignore_errors=True)
+
+
+def run_scale(n_counties, n_months, repeat=3, num_simulations=1000, horizon=120, seed=0):
+    """
+    Runs every benchmark on one synthetic dataset.
+
+    Parameters:
+        n_counties - number of counties
+        n_months - number of months
+        repeat - timed calls per benchmark
+        num_simulations - Monte Carlo simulations
+        horizon - Monte Carlo horizon in months
+        seed - seed of the data generator and the simulation
+
+    Returns:
+        dict with the scale, row counts and per-benchmark timings
+    """
+    results = {}
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='realestate-bench-') as directory:
+        region_df, sales_df = synthetic_zillow.write_dataset(directory, n_counties, n_months, seed)
+        client = red.LocalZillowClient(region_df, sales_df)
+        os.chdir(directory)
+        try:
+            # Loading
+            results['load_county_table'] = time_call(red.load_county_table, repeat)
+            results['load_zillow_region_data'] = time_call(
+                lambda: red.load_zillow_region_data(client), repeat)
+            regions = red.load_zillow_region_data(client)
+            results['load_master_df_cold'] = time_call(
+                lambda: red.load_master_df(region_df=regions), repeat, setup=_clear_disk_cache)
+            results['load_master_df_warm'] = time_call(
+                lambda: red.load_master_df(region_df=regions), repeat)
+            master_df = red.load_master_df(region_df=regions)
+            results['panel_from_frame'] = time_call(lambda: ValuePanel.from_frame(master_df), repeat)
+            panel = ValuePanel.from_frame(master_df)
+
+            # Statistics
+            results['stats_mean_dataframe'] = time_call(
+                lambda: res.get_county_df_with_mean(master_df, '2010-01-01', '2020-01-01'), repeat)
+            results['stats_mean_panel_cold'] = time_call(
+                lambda: res.get_county_df_with_mean(panel, '2010-01-01', '2020-01-01'), repeat,
+                setup=res.prefix_sum_index.cache_clear)
+            results['stats_mean_panel_warm'] = time_call(
+                lambda: res.get_county_df_with_mean(panel, '2012-01-01', '2018-01-01'), repeat)
+            results['stats_cum_pct_change_dataframe'] = time_call(
+                lambda: res.get_county_df_with_cum_pct_change(master_df, '2010-01-01', '2020-01-01'),
+                repeat)
+            results['stats_cum_pct_change_panel'] = time_call(
+                lambda: res.get_county_df_with_cum_pct_change(panel, '2010-01-01', '2020-01-01'),
+                repeat)
+
+            # MACD
+            grouped = master_df.groupby('date')['value']
+            nationwide_df = grouped.sum().astype('float64').to_frame('value')
+            nationwide_df['avg'] = nationwide_df['value'] / grouped.count()
+            label = panel.regions['label'].iat[0]
+            # The DataFrame path expects the "county, state" label in the county column
+            labelled_df = pd.DataFrame({
+                'date': master_df['date'],
+                'county': master_df['county'].astype(str) + ', ' + master_df['state'].astype(str),
+                'value': master_df['value'],
+            })
+            results['macd_nationwide'] = time_call(
+                lambda: macd.get_nationwide_macd(nationwide_df, 6, 12, 4), repeat)
+            results['macd_county_dataframe'] = time_call(
+                lambda: macd.get_county_macd(labelled_df, label, 6, 12, 4), repeat)
+            results['macd_panel'] = time_call(
+                lambda: macd.get_macd_panel(panel, 6, 12, 4), repeat,
+                setup=macd.get_macd_panel.cache_clear)
+            results['macd_screen_momentum'] = time_call(
+                lambda: macd.screen_momentum(panel, 6, 12, 4, crossover='bullish', max_age=3), repeat)
+
+            # Monte Carlo, on three counties as in the app
+            labels = list(panel.regions['label'].iloc[:3])
+            mc_df = monte_carlo_input(panel, labels, '2015-01-31', '2022-06-30')
+            results['monte_carlo'] = time_call(
+                lambda: MCSimulation(mc_df, "", num_simulations, horizon, seed=seed)
+                .calc_cumulative_return(), repeat)
+        finally:
+            os.chdir(working_dir)
+
+    return {
+        'counties': n_counties,
+        'months': n_months,
+        'sales_rows': len(sales_df),
+        'master_rows': len(master_df),
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    """
+    Prints the median time of every benchmark against a previous run.
+    """
+    previous_scales = {(s['counties'], s['months']): s for s in previous['scales']}
+    for scale in current['scales']:
+        old = previous_scales.get((scale['counties'], scale['months']))
+        if old is None:
+            continue
+        print(f"\n{scale['counties']} counties x {scale['months']} months")
+        for name, timing in scale['results'].items():
+            if name not in old['results']:
+                continue
+            before = old['results'][name]['median']
+            after = timing['median']
+            print(f'  {name:34s} {before * 1000:10.1f} ms -> {after * 1000:10.1f} ms'
+                  f'  ({after / before:5.2f}x)')
+
+
+def parse_scales(text):
+    """
+    Parses "300x120,3143x308" into [(300, 120), (3143, 308)].
+    """
+    return [tuple(int(n) for n in scale.split('x')) for scale in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analytics on synthetic data.')
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help='comma-separated COUNTIESxMONTHS, default %(default)s')
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per benchmark')
+    parser.add_argument('--simulations', type=int, default=1000, help='Monte Carlo simulations')
+    parser.add_argument('--horizon', type=int, default=120, help='Monte Carlo horizon in months')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file, default results/benchmark-<timestamp>.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'scales': [],
+    }
+    for n_counties, n_months in parse_scales(args.scales):
+        print(f'Running {n_counties} counties x {n_months} months...')
+        report['scales'].append(run_scale(n_counties, n_months, args.repeat,
+                                          args.simulations, args.horizon, args.seed))
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
@@ -0,0 +1,184 @@
+"""
+Synthetic Zillow-shaped data for running the app's data pipeline offline.
+
+Generates the three inputs the app reads, with the same columns and quirks
+as the real ones:
+
+    regions - ZILLOW/REGIONS rows ("X County; ST; Metro, ST" region names)
+    sales - ZILLOW/DATA rows (indicator_id, region_id, date, value)
+    counties_w_coordinates.csv - footnoted header, units row, degree signs
+        and en-dash minus signs
+
+Counties start reporting on different months and have a few missing months,
+like the real data.  Usage:
+
+    python benchmarks/synthetic_zillow.py OUTPUT_DIR --counties 3143 --months 308
+"""
+import argparse
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import realestate_data as red
+
+
+STATES = [
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL',
+    'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE',
+    'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD',
+    'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+]
+
+# Zillow names county-equivalents by their local type
+_REGION_SUFFIX = {'LA': ' Parish', 'AK': ' Borough'}
+
+# Header of counties_w_coordinates.csv, followed by its units row
+_COORDINATES_HEADER = (
+    'Sort [1],State,FIPS,County [2],County Seat(s) [3],Population,Land Area,Land Area,'
+    'Water Area,Water Area,Total Area,Total Area,Latitude,Longitude\n'
+    ',,,,,-2010,km²,mi²,km²,mi²,km²,mi²,,\n'
+)
+
+
+def generate(n_counties=3143, n_months=308, seed=0, missing_rate=0.01, end_date='2022-08-31'):
+    """
+    Generates synthetic region, sales and county coordinate data.
+
+    About half of the counties report from the first month; the others start
+    at a random later month, up to 60% into the period.  After a county
+    starts, each month is missing with probability `missing_rate`.  Values
+    follow a random walk with a shared national trend plus a county-specific
+    drift and volatility.
+
+    Parameters:
+        n_counties - number of counties
+        n_months - number of monthly dates, ending at `end_date`
+        seed - seed of the random generator
+        missing_rate - probability that a month after the county's start is missing
+        end_date - last month-end date
+
+    Returns:
+        tuple of (region DataFrame, sales DataFrame, county DataFrame)
+
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=n_months, freq='M')
+
+    # Counties and their Zillow regions
+    states = np.array(STATES)[np.arange(n_counties) % len(STATES)]
+    names = np.array([f'Synthetic {i}' for i in range(n_counties)])
+    fips = np.arange(n_counties, dtype=np.int32) + 1001
+    county_df = pd.DataFrame({
+        'fips': fips,
+        'county': names,
+        'state': states,
+        'latitude': rng.uniform(25.0, 49.0, n_counties),
+        'longitude': rng.uniform(-124.0, -67.0, n_counties),
+        'population': rng.integers(1_000, 2_000_000, n_counties),
+        'land_area_km2': rng.uniform(50.0, 20_000.0, n_counties),
+    })
+    region_names = [
+        f"{name}{_REGION_SUFFIX.get(state, ' County')}; {state}; Metro {i % 400}, {state}"
+        for i, (name, state) in enumerate(zip(names, states))
+    ]
+    region_df = pd.DataFrame({
+        'region_id': np.arange(n_counties) + 100_000,
+        'region_type': 'county',
+        'region': region_names,
+    })
+
+    # Values: national trend + county drift and noise, compounded monthly
+    national = rng.normal(0.003, 0.006, n_months)
+    drift = rng.normal(0.0, 0.002, (n_counties, 1))
+    volatility = rng.uniform(0.003, 0.015, (n_counties, 1))
+    log_returns = national + drift + volatility * rng.standard_normal((n_counties, n_months))
+    start_value = np.exp(rng.normal(np.log(150_000), 0.5, (n_counties, 1)))
+    values = start_value * np.exp(np.cumsum(log_returns, axis=1))
+
+    # Staggered starts and scattered missing months
+    starts = np.where(rng.random(n_counties) < 0.5, 0,
+                      rng.integers(0, max(1, int(n_months * 0.6)), n_counties))
+    observed = np.arange(n_months) >= starts[:, None]
+    observed &= rng.random((n_counties, n_months)) >= missing_rate
+    observed[np.arange(n_counties), np.minimum(starts, n_months - 1)] = True
+
+    rows, columns = np.nonzero(observed)
+    sales_df = pd.DataFrame({
+        'indicator_id': red.ZILLOW_INDICATOR,
+        'region_id': region_df['region_id'].values[rows],
+        'date': dates[columns],
+        'value': np.round(values[rows, columns]),
+    })
+    return region_df, sales_df, county_df
+
+
+def write_coordinates_csv(county_df, path):
+    """
+    Writes a county DataFrame in the layout of counties_w_coordinates.csv.
+    """
+    def signed(values):
+        # The source uses "+" for positive and an en dash for negative numbers
+        return [('+' if v >= 0 else '–') + f'{abs(v):.6f}°' for v in values]
+
+    land = county_df['land_area_km2'].values
+    table = pd.DataFrame({
+        'sort': np.arange(1, len(county_df) + 1),
+        'state': county_df['state'].values,
+        'fips': county_df['fips'].values,
+        'county': county_df['county'].values,
+        'seat': county_df['county'].values,
+        'population': [f'{p:,}' for p in county_df['population'].values],
+        'land_km2': [f'{a:,.3f}' for a in land],
+        'land_mi2': np.round(land / 2.58999, 3),
+        'water_km2': np.round(land * 0.02, 3),
+        'water_mi2': np.round(land * 0.02 / 2.58999, 3),
+        'total_km2': [f'{a:,.3f}' for a in land * 1.02],
+        'total_mi2': np.round(land * 1.02 / 2.58999, 3),
+        'latitude': signed(county_df['latitude'].values),
+        'longitude': signed(county_df['longitude'].values),
+    })
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(_COORDINATES_HEADER)
+        table.to_csv(f, header=False, index=False)
+
+
+def write_dataset(directory, n_counties=3143, n_months=308, seed=0, missing_rate=0.01):
+    """
+    Generates a dataset and writes the sales and coordinate CSV files under
+    the file names the app reads, so realestate_data works with `directory`
+    as the working directory.
+
+    Parameters:
+        directory - output directory, created if needed
+        n_counties, n_months, seed, missing_rate - see generate
+
+    Returns:
+        tuple of (region DataFrame, sales DataFrame) for a LocalZillowClient
+
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    region_df, sales_df, county_df = generate(n_counties, n_months, seed, missing_rate)
+
+    sales_df.to_csv(directory / red.ZILLOW_DATA_CSV.name, index=False, date_format='%Y-%m-%d')
+    write_coordinates_csv(county_df, directory / red.COUNTY_COORDINATES_CSV.name)
+    return region_df, sales_df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic Zillow-shaped dataset.')
+    parser.add_argument('directory', help='output directory')
+    parser.add_argument('--counties', type=int, default=3143)
+    parser.add_argument('--months', type=int, default=308)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    region_df, sales_df = write_dataset(args.directory, args.counties, args.months,
+                                        args.seed, args.missing_rate)
+    region_df.to_csv(Path(args.directory) / 'regions.csv', index=False)
+    print(f'Wrote {len(region_df)} regions and {len(sales_df)} sales rows to {args.directory}')
@@ -0,0 +1,147 @@
+"""
+Benchmark of the Monte Carlo sampling strategies: how many simulations each
+needs to pin down the mean and the 95% confidence interval of the final
+cumulative return to a target precision.
+
+Every strategy is run with independent seeds at a range of simulation counts
+on a synthetic three-county portfolio.  The spread of the estimates across
+seeds is their actual standard error; it is shown next to the standard error
+MCSimulation reports from a single run.  Assuming the error shrinks with the
+square root of the number of simulations, the largest run gives the number of
+simulations needed for the half-width of a 95% interval around each estimate
+to reach --target.  Usage:
+
+    python benchmarks/variance_reduction.py --target 0.01 --replications 20
+"""
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from MCForecastTools import MCSimulation
+
+import synthetic_zillow
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Label -> MCSimulation sampling options
+STRATEGIES = {
+    'random': {},
+    'antithetic': {'sampling': 'antithetic'},
+    'sobol': {'sampling': 'sobol'},
+    'random + control variate': {'control_variate': True},
+    'antithetic + control variate': {'sampling': 'antithetic', 'control_variate': True},
+}
+
+DEFAULT_SIMULATIONS = '250,500,1000,2000,4000'
+
+ESTIMATES = ['Mean', '95% CI Lower', '95% CI Upper']
+
+
+def portfolio_input(n_counties=3, n_months=90, seed=0):
+    """
+    Builds MCSimulation input for a synthetic portfolio of counties.
+
+    Returns:
+        DataFrame with a (county, column) MultiIndex on the columns
+    """
+    _, sales_df, _ = synthetic_zillow.generate(n_counties, n_months, seed, missing_rate=0)
+    frames = {region_id: frame[['date', 'value']].reset_index(drop=True)
+              for region_id, frame in sales_df.sort_values('date').groupby('region_id')}
+    return pd.concat(frames, axis=1)
+
+
+def run_strategy(monte_carlo_df, options, num_simulations, horizon=120, replications=20):
+    """
+    Runs one strategy with `replications` seeds.
+
+    Returns:
+        dict with the spread of the estimates across seeds (actual standard
+        error), the mean reported standard error and the seconds per run
+    """
+    estimates, reported, seconds = [], [], []
+    for seed in range(replications):
+        simulation = MCSimulation(monte_carlo_df, "", num_simulations, horizon, seed=seed, **options)
+        start = time.perf_counter()
+        simulation.calc_cumulative_return()
+        seconds.append(time.perf_counter() - start)
+        estimates.append([simulation.mean_estimate, *simulation.confidence_interval.values])
+        reported.append(simulation.standard_errors[ESTIMATES].values)
+    return {
+        'simulations': num_simulations,
+        'standard_error': dict(zip(ESTIMATES, np.std(estimates, axis=0, ddof=1).tolist())),
+        'reported_standard_error': dict(zip(ESTIMATES, np.mean(reported, axis=0).tolist())),
+        'seconds': float(np.median(seconds)),
+    }
+
+
+def simulations_needed(run, target, z=1.96):
+    """
+    Simulations needed for z * standard error to reach `target`, extrapolated
+    from one run with the 1 / sqrt(simulations) scaling.
+
+    Returns:
+        dict of estimate -> simulations
+    """
+    return {name: int(np.ceil(run['simulations'] * (z * error / target) ** 2))
+            for name, error in run['standard_error'].items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare Monte Carlo sampling strategies.')
+    parser.add_argument('--simulations', default=DEFAULT_SIMULATIONS,
+                        help='comma-separated simulation counts, default %(default)s')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES),
+                        help='comma-separated strategies, default all')
+    parser.add_argument('--replications', type=int, default=20, help='seeds per run')
+    parser.add_argument('--horizon', type=int, default=120, help='months simulated')
+    parser.add_argument('--target', type=float, default=0.01,
+                        help='target 95%% half-width of each estimate, in cumulative return '
+                             '(0.01 = 1 percentage point)')
+    parser.add_argument('--output', help='results file, default results/variance-<timestamp>.json')
+    args = parser.parse_args()
+
+    monte_carlo_df = portfolio_input()
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'target': args.target,
+        'strategies': {},
+    }
+    counts = [int(n) for n in args.simulations.split(',')]
+    for label in args.strategies.split(','):
+        runs = [run_strategy(monte_carlo_df, STRATEGIES[label], n, args.horizon, args.replications)
+                for n in counts]
+        needed = simulations_needed(runs[-1], args.target)
+        report['strategies'][label] = {'runs': runs, 'simulations_needed': needed}
+
+        print(f'\n{label}')
+        print(f"  {'simulations':>11s}  {'SE mean':>9s}  {'SE lower':>9s}  {'SE upper':>9s}"
+              f"  {'reported':>27s}  {'ms/run':>7s}")
+        for run in runs:
+            actual = run['standard_error']
+            reported = run['reported_standard_error']
+            print(f"  {run['simulations']:11d}  "
+                  + '  '.join(f'{actual[name]:9.5f}' for name in ESTIMATES)
+                  + '  ' + ' '.join(f'{reported[name]:8.5f}' for name in ESTIMATES)
+                  + f"  {run['seconds'] * 1000:7.1f}")
+        print('  simulations needed for +/-{}: '.format(args.target)
+              + ', '.join(f'{name} {needed[name]}' for name in ESTIMATES))
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"variance-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nWrote {output}')
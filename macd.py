@@ -1,14 +1,72 @@
-import os
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-import hvplot.pandas
-from pathlib import Path
-# For technical analysis
-import pandas_ta as ta
+from realestate_panel import ValuePanel
+from realestate_rollup import RollupCube
+from realestate_instrument import instrumented
 
 
+# pandas_ta is optional and slow to import, so it is only imported by the
+# first MACD computed; without it the NumPy implementation below is used.
+_pandas_ta = None
+
+
+def _technical_analysis():
+    """
+    Returns the pandas_ta module, or False when it is not installed.
+    """
+    global _pandas_ta
+    if _pandas_ta is None:
+        try:
+            import pandas_ta
+            _pandas_ta = pandas_ta
+        except ImportError:
+            _pandas_ta = False
+    return _pandas_ta
+
+
+def compute_macd(df, close, fast, slow, signal):
+    """
+    MACD of one column, as pandas_ta's DataFrame.ta.macd returns it.
+
+    Uses pandas_ta when it is installed, otherwise the same EMAs computed with
+    NumPy (see _batched_ema), so pandas_ta is not required.  Series too short
+    for the EMAs give NaN columns.
+
+    Parameters:
+        df - DataFrame with the `close` column
+        close - column to compute the MACD of
+        fast, slow, signal - EMA lengths in rows
+
+    Returns:
+        DataFrame on the index of `df` with the MACD_, MACDh_ and MACDs_
+        columns named after the parameters
+    """
+    if _technical_analysis():
+        macd_df = df.ta.macd(close=close, fast=fast, slow=slow, signal=signal)
+        # pandas_ta returns None for series shorter than the EMAs
+        if macd_df is not None:
+            return macd_df
+
+    if slow < fast:
+        fast, slow = slow, fast
+    values = df[close].to_numpy(dtype=np.float64)[np.newaxis, :]
+    macd_line = _batched_ema(values, fast) - _batched_ema(values, slow)
+    signal_line = _batched_ema(macd_line, signal, start=slow - 1)
+    return pd.DataFrame({
+        f'MACD_{fast}_{slow}_{signal}': macd_line[0],
+        f'MACDh_{fast}_{slow}_{signal}': (macd_line - signal_line)[0],
+        f'MACDs_{fast}_{slow}_{signal}': signal_line[0],
+    }, index=df.index)
+
+
+@instrumented
 def get_nationwide_macd(nationwide_df, fast, slow, signal):
-    nationwide_macd_df = nationwide_df.ta.macd(
-        close='avg', fast=fast, slow=slow, signal=signal, append=True)
+    # The rollup cube keeps the nationwide series precomputed
+    if isinstance(nationwide_df, RollupCube):
+        nationwide_df = nationwide_df.frame('nation')
+
+    nationwide_macd_df = compute_macd(nationwide_df, 'avg', fast, slow, signal)
     # Making DataFrame look nice
     nationwide_macd_df = nationwide_macd_df.rename(
         columns={f'MACD_{fast}_{slow}_{signal}': 'fast_ema', f'MACDh_{fast}_{slow}_{signal}': 'signal', f'MACDs_{fast}_{slow}_{signal}': 'slow_ema'}).dropna()
@@ -17,13 +75,34 @@ def get_nationwide_macd(nationwide_df, fast, slow, signal):
     return nationwide_macd_df
 
 
+@instrumented
+def get_state_macd(cube, state, fast, slow, signal):
+    """
+    MACD of a state's average home value, read from the rollup cube.
+
+    Parameters:
+        cube - RollupCube
+        state - state code, e.g. 'CA'
+        fast, slow, signal - EMA lengths in months
+
+    Returns:
+        DataFrame like get_nationwide_macd
+    """
+    return get_nationwide_macd(cube.frame('state', state), fast, slow, signal)
+
+
+@instrumented
 def get_county_macd(filtered_df, county, fast, slow, signal):
 
-    county_macd_df = filtered_df.copy()
-    county_macd_df = county_macd_df[county_macd_df['county'] == county]
+    # With a ValuePanel the MACD of every county is computed once per parameter
+    # triple and cached, so picking another county is a lookup
+    if isinstance(filtered_df, ValuePanel):
+        return get_macd_panel(filtered_df, fast, slow, signal).county_frame(county)
+    else:
+        county_macd_df = filtered_df.copy()
+        county_macd_df = county_macd_df[county_macd_df['county'] == county]
 
-    county_macd_df.ta.macd(close='value', fast=fast,
-                           slow=slow, signal=signal, append=True)
+    county_macd_df = county_macd_df.join(compute_macd(county_macd_df, 'value', fast, slow, signal))
 
     # Making DataFrame look nice
     county_macd_df = county_macd_df.rename(columns={f'MACD_{fast}_{slow}_{signal}': 'fast_ema',
@@ -35,3 +114,192 @@ def get_county_macd(filtered_df, county, fast, slow, signal):
                    ] = county_macd_df[['fast_ema', 'signal', 'slow_ema']]/1000
 
     return county_macd_df
+
+
+class MacdPanel:
+    """
+    MACD of every county in a ValuePanel, as (n_regions, n_months) arrays
+    aligned with the panel.  Months before a county's signal line starts,
+    and months without a value, are NaN.
+
+    Attributes:
+        macd - fast EMA minus slow EMA
+        signal - EMA of the MACD line
+        histogram - MACD minus signal
+    """
+
+    def __init__(self, panel, fast, slow, signal, macd, signal_line, histogram):
+        self.panel = panel
+        self.params = (fast, slow, signal)
+        self.macd = macd
+        self.signal = signal_line
+        self.histogram = histogram
+
+    def county_frame(self, county):
+        """
+        Returns one county's MACD in the same layout as get_county_macd.
+
+        Parameters:
+            county - region_id or "county, state" label
+
+        Returns:
+            DataFrame indexed by date with county, fast_ema, signal and slow_ema
+        """
+        row = self.panel.position(county)
+        valid = ~np.isnan(self.signal[row])
+        county_macd_df = pd.DataFrame({
+            'date': self.panel.dates[valid],
+            'county': self.panel.label(county),
+            # Same (mis)labelling as the pandas_ta based code path
+            'fast_ema': self.macd[row, valid] / 1000,
+            'signal': self.histogram[row, valid] / 1000,
+            'slow_ema': self.signal[row, valid] / 1000,
+        })
+        return county_macd_df.set_index('date')
+
+
+@instrumented
+# Each entry holds three float64 region x month arrays (about 23 MB for every
+# county), so only the last few EMA settings are kept
+@lru_cache(maxsize=4)
+def get_macd_panel(panel, fast, slow, signal):
+    """
+    Computes MACD for every county of a ValuePanel at once.
+
+    Follows pandas_ta's macd: EMAs seeded with the simple mean of their first
+    `length` values, then ewm(span=length, adjust=False), and a signal EMA
+    starting at the first MACD value.  Each county's observed values are
+    shifted to the left edge first, so the EMAs step over missing months the
+    same way pandas_ta does over the rows of one county.
+
+    Results of the last four (panel, fast, slow, signal) are cached.
+
+    Parameters:
+        panel - ValuePanel
+        fast - fast EMA length in months
+        slow - slow EMA length in months
+        signal - signal EMA length in months
+
+    Returns:
+        MacdPanel
+    """
+    if slow < fast:
+        fast, slow = slow, fast
+
+    # Left-align each county's observed values
+    observed = ~np.isnan(panel.values)
+    order = np.argsort(~observed, axis=1, kind='stable')
+    compact = np.take_along_axis(panel.values, order, axis=1).astype(np.float64)
+
+    macd_line = _batched_ema(compact, fast) - _batched_ema(compact, slow)
+    signal_line = _batched_ema(macd_line, signal, start=slow - 1)
+    histogram = macd_line - signal_line
+
+    # Scatter back to the panel's months
+    results = []
+    for compacted in (macd_line, signal_line, histogram):
+        aligned = np.full(panel.values.shape, np.nan)
+        np.put_along_axis(aligned, order, compacted, axis=1)
+        aligned[~observed] = np.nan
+        results.append(aligned)
+
+    return MacdPanel(panel, fast, slow, signal, *results)
+
+
+@instrumented
+def screen_momentum(panel, fast, slow, signal, top_n=25, sort_by='histogram',
+                    crossover=None, max_age=None, ascending=False):
+    """
+    Ranks every county by its latest MACD histogram and finds its most recent
+    signal-line crossover.
+
+    A bullish crossover is a month where the histogram turns positive, a
+    bearish one where it turns zero or negative.  The age of a crossover is the
+    number of months with data since it happened (0 = latest month).
+
+    Parameters:
+        panel - ValuePanel
+        fast - fast EMA length in months
+        slow - slow EMA length in months
+        signal - signal EMA length in months
+        top_n - number of counties to return, or None for all
+        sort_by - column to rank by: histogram, histogram_pct, macd or crossover_age
+        crossover - only keep counties whose last crossover is 'bullish' or 'bearish'
+        max_age - only keep crossovers at most this many months old
+        ascending - sort order of the ranking column
+
+    Returns:
+        DataFrame with one row per county: county, state, region_id, date,
+        value, macd, signal, histogram, histogram_pct, crossover,
+        crossover_date and crossover_age
+    """
+    macd_panel = get_macd_panel(panel, fast, slow, signal)
+    histogram = macd_panel.histogram
+    valid = ~np.isnan(histogram)
+    n_regions, n_months = histogram.shape
+    rows = np.arange(n_regions)
+    months = np.arange(n_months)
+
+    # Latest month with a histogram value per county
+    latest = np.where(valid, months, -1).max(axis=1)
+    has_macd = latest >= 0
+    latest = np.maximum(latest, 0)
+
+    # Compare each histogram value with the previous one, stepping over gaps
+    previous = pd.DataFrame(histogram.T).ffill().shift(1).values.T
+    positive = histogram > 0
+    was_positive = previous > 0
+    compared = valid & ~np.isnan(previous)
+    bullish = compared & positive & ~was_positive
+    bearish = compared & ~positive & was_positive
+
+    last_cross = np.where(bullish | bearish, months, -1).max(axis=1)
+    has_cross = last_cross >= 0
+    cross_col = np.maximum(last_cross, 0)
+    valid_count = np.cumsum(valid, axis=1)
+
+    value = panel.values[rows, latest].astype(np.float64)
+    screen_df = panel.regions[['label', 'state', 'region_id']].rename(columns={'label': 'county'})
+    screen_df = screen_df.assign(
+        date=panel.dates[latest],
+        value=value,
+        macd=macd_panel.macd[rows, latest],
+        signal=macd_panel.signal[rows, latest],
+        histogram=histogram[rows, latest],
+        histogram_pct=histogram[rows, latest] / value * 100,
+        crossover=np.where(~has_cross, None, np.where(bullish[rows, cross_col], 'bullish', 'bearish')),
+        crossover_date=pd.Series(panel.dates[cross_col]).where(has_cross).values,
+        crossover_age=np.where(has_cross, valid_count[rows, latest] - valid_count[rows, cross_col], np.nan),
+    )
+    screen_df = screen_df[has_macd]
+
+    if crossover is not None:
+        screen_df = screen_df[screen_df['crossover'] == crossover]
+    if max_age is not None:
+        screen_df = screen_df[screen_df['crossover_age'] <= max_age]
+
+    screen_df = screen_df.sort_values(sort_by, ascending=ascending, kind='mergesort')
+    if top_n is not None:
+        screen_df = screen_df.head(top_n)
+    return screen_df.reset_index(drop=True)
+
+
+def _batched_ema(values, length, start=0):
+    """
+    pandas_ta style EMA along the rows of a left-aligned matrix.
+
+    The EMA starts at column start + length - 1 with the mean of the first
+    `length` values from `start`, and continues with ewm(span=length,
+    adjust=False).  Rows that run out of values become NaN.
+    """
+    n_rows, n_cols = values.shape
+    ema = np.full((n_rows, n_cols), np.nan)
+    seed = start + length - 1
+    if seed >= n_cols:
+        return ema
+
+    alpha = 2 / (length + 1)
+    ema[:, seed] = values[:, start:seed + 1].mean(axis=1)
+    for t in range(seed + 1, n_cols):
+        ema[:, t] = alpha * values[:, t] + (1 - alpha) * ema[:, t - 1]
+    return ema
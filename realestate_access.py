@@ -0,0 +1,230 @@
+import threading
+import time
+
+import pandas as pd
+
+import realestate_data as red
+from realestate_geo import CountySpatialIndex
+from realestate_panel import ValuePanel
+from realestate_rollup import RollupCube
+
+
+# Process-wide memo of loaded and derived data.  Streamlit re-executes the app
+# script on every rerun but keeps imported modules, so everything stored here
+# is shared by all reruns and sessions of the worker process.
+_memo = {}
+_load_seconds = {}
+_dependencies = {}
+_hits = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Per-thread (i.e. per Streamlit script run) record of what was served from the
+# memo, and the stack of items currently being loaded
+_rerun = threading.local()
+
+
+def _memoized(name, loader):
+    """
+    Returns the memoized value for `name`, calling `loader` on first use.
+
+    Concurrent first calls for the same name wait for a single load.  The
+    load time recorded for an item excludes memoized items it loads itself,
+    which are recorded as its dependencies instead.  Memo reads and their
+    bookkeeping hold _locks_guard, so a clear() from another session's
+    refresh never lands between them.
+    """
+    loading = _loading_stack()
+    with _locks_guard:
+        if loading:
+            _dependencies.setdefault(loading[-1][0], set()).add(name)
+        if name in _memo:
+            _record_hit(name)
+            return _memo[name]
+        lock = _locks.setdefault(name, threading.Lock())
+
+    with lock:
+        with _locks_guard:
+            if name in _memo:
+                _record_hit(name)
+                return _memo[name]
+            _dependencies[name] = set()
+
+        frame = [name, 0.0]
+        loading.append(frame)
+        start = time.perf_counter()
+        try:
+            value = loader()
+        finally:
+            loading.pop()
+        elapsed = time.perf_counter() - start
+        if loading:
+            loading[-1][1] += elapsed
+
+        with _locks_guard:
+            _load_seconds[name] = elapsed - frame[1]
+            _hits[name] = 0
+            _memo[name] = value
+        return value
+
+
+def _loading_stack():
+    if not hasattr(_rerun, 'loading'):
+        _rerun.loading = []
+    return _rerun.loading
+
+
+def _record_hit(name):
+    """
+    Counts a memo hit and marks the item and everything it was built from as
+    saved for the current script run.  Called with _locks_guard held; items
+    a clear() dropped while they were loading count as saving nothing.
+    """
+    _hits[name] = _hits.get(name, 0) + 1
+    saved = getattr(_rerun, 'saved', None)
+    if saved is None:
+        return
+    pending = [name]
+    while pending:
+        item = pending.pop()
+        if item not in saved:
+            saved[item] = _load_seconds.get(item, 0.0)
+            pending.extend(_dependencies.get(item, ()))
+
+
+def master_tables():
+    """
+    Normalized master data: the region dimension table and the memory-mapped
+    fact table (see red.load_master_tables).
+    """
+    return _memoized('master_tables', red.load_master_tables)
+
+
+def master_df():
+    """
+    Merged Zillow sales, region and coordinate data, one row per region and
+    month.  Joined from master_tables on first use; the app sections read the
+    panel instead, so this long frame is only built when asked for.
+    """
+    return _memoized('master_df', lambda: red.join_master_df(*master_tables()))
+
+
+def county_coordinates():
+    """
+    County coordinates from counties_w_coordinates.csv.
+    """
+    return _memoized('county_coordinates', red.load_county_coordinates)
+
+
+def county_table():
+    """
+    FIPS-keyed county table with float32 coordinates.
+    """
+    return _memoized('county_table', red.load_county_table)
+
+
+def spatial_index():
+    """
+    CountySpatialIndex over the county table, for radius and nearest-county queries.
+    """
+    return _memoized('spatial_index', lambda: CountySpatialIndex.from_county_table(county_table()))
+
+
+def panel():
+    """
+    Dense region x month ValuePanel built from the master tables.
+    """
+    return _memoized('panel', lambda: ValuePanel.from_tables(*master_tables()))
+
+
+def county_list():
+    """
+    Unique "county, state" labels for the county pickers.
+    """
+    return _memoized('county_list', lambda: panel().regions['label'].unique())
+
+
+def rollup():
+    """
+    RollupCube with the sum, count and mean of values per month at nation,
+    state and county level.
+    """
+    return _memoized('rollup', lambda: RollupCube.from_panel(panel()))
+
+
+def nationwide_df():
+    """
+    Nationwide sum of county values per date, and its average over the number
+    of counties reporting on that date.
+    """
+    return _memoized('nationwide_df', lambda: rollup().frame('nation'))
+
+
+def refresh(client=None):
+    """
+    Syncs new Zillow rows into the cache and reloads the memoized data.
+
+    The rollup cube is carried over and only aggregates the new or changed
+    months.
+
+    Parameters:
+        client - Zillow API client, defaults to NasdaqZillowClient
+
+    Returns:
+        DataFrame of the newly synced sales rows
+    """
+    _, new_rows = red.refresh_master_df(client)
+    if new_rows.empty:
+        return new_rows
+
+    previous = _memo.get('rollup')
+    clear()
+    if previous is not None:
+        _memoized('rollup', lambda: previous.extend(panel()))
+    return new_rows
+
+
+def start_rerun():
+    """
+    Starts recording memo hits for the current script run.
+    """
+    _rerun.saved = {}
+    _rerun.started = time.perf_counter()
+
+
+def rerun_report():
+    """
+    Summarizes the current script run: how long it has taken so far and how
+    much load time the memo saved it.
+
+    Returns:
+        dict with elapsed_seconds, saved_seconds and a per-item saved DataFrame
+    """
+    saved = getattr(_rerun, 'saved', None) or {}
+    started = getattr(_rerun, 'started', time.perf_counter())
+    return {
+        'elapsed_seconds': time.perf_counter() - started,
+        'saved_seconds': sum(saved.values()),
+        'saved': pd.DataFrame({'load_seconds': pd.Series(saved, dtype='float64')}),
+    }
+
+
+def memo_report():
+    """
+    Returns a DataFrame with the first-load time and hit count of every memoized item.
+    """
+    return pd.DataFrame({
+        'load_seconds': pd.Series(_load_seconds, dtype='float64'),
+        'hits': pd.Series(_hits, dtype='int64'),
+    })
+
+
+def clear():
+    """
+    Drops every memoized item, e.g. after refreshing the data.
+    """
+    with _locks_guard:
+        _memo.clear()
+        _load_seconds.clear()
+        _dependencies.clear()
+        _hits.clear()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Default location of the on-disk cache, relative to where the app is started.
+CACHE_DIR = Path('.realestate_cache')
+
+# Bump when the on-disk layout changes so old caches are rebuilt.
+FORMAT_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file without reading it into memory at once.
+
+    Parameters:
+        path - file to hash
+        chunk_size - number of bytes read per step
+
+    Returns:
+        hex digest string
+
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_sources(paths):
+    """
+    Records size, modification time and content hash for each source file.
+
+    Parameters:
+        paths - list of source file paths the cached data is built from
+
+    Returns:
+        list of dicts, one per source file
+
+    """
+    sources = []
+    for path in paths:
+        stat = os.stat(path)
+        sources.append({
+            'path': str(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_digest(path),
+        })
+    return sources
+
+
+def _sources_match(recorded, paths):
+    """
+    Checks the source files against the ones recorded in a cache manifest.
+
+    Size and modification time are compared first.  Only when those differ is
+    the file rehashed, so an untouched source costs a single stat call, and a
+    touched-but-identical file (e.g. a fresh checkout) is still a cache hit.
+    """
+    if len(recorded) != len(paths):
+        return False
+    for entry, path in zip(recorded, paths):
+        if entry['path'] != str(path) or not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+            continue
+        if stat.st_size != entry['size'] or file_digest(path) != entry['sha256']:
+            return False
+    return True
+
+
+def save_frame(df, name, source_paths=(), cache_dir=CACHE_DIR, version=0):
+    """
+    Saves a DataFrame as one .npy file per column plus a JSON manifest.
+
+    Categorical columns are stored as integer codes plus their categories,
+    datetime columns as int32 days since the epoch and every other column as
+    its own NumPy dtype, so compact dtypes chosen by the caller are kept.
+
+    Parameters:
+        df - DataFrame to cache
+        name - cache entry name, used as the directory name
+        source_paths - files the DataFrame was built from; the cache entry is
+            only valid while they are unchanged
+        cache_dir - root directory of the cache
+        version - version of the cached data's schema, bumped by the caller
+            when the columns it builds change
+
+    Returns:
+        path of the cache entry directory
+
+    """
+    target = Path(cache_dir) / name
+    staging = Path(cache_dir) / f'{name}.tmp-{os.getpid()}'
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        series = df[column]
+        file_stem = f'col{i}'
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(staging / f'{file_stem}.npy', series.cat.codes.values)
+            np.save(staging / f'{file_stem}.categories.npy', series.cat.categories.values.astype(str))
+            kind = 'category'
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            days = series.values.astype('datetime64[D]').astype(np.int32)
+            np.save(staging / f'{file_stem}.npy', days)
+            kind = 'datetime'
+        else:
+            values = series.values
+            if values.dtype == object:
+                values = values.astype(str)
+            np.save(staging / f'{file_stem}.npy', values)
+            kind = 'array'
+        columns.append({'name': column, 'file': file_stem, 'kind': kind})
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'rows': len(df),
+        'columns': columns,
+        'sources': describe_sources(source_paths),
+    }
+    with open(staging / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the finished entry in so readers never see a half-written cache
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    return target
+
+
+def load_frame(name, source_paths=(), cache_dir=CACHE_DIR, mmap=True, version=0):
+    """
+    Loads a DataFrame saved with save_frame.
+
+    Parameters:
+        name - cache entry name
+        source_paths - files the cached DataFrame must have been built from
+        cache_dir - root directory of the cache
+        mmap - memory-map the column files instead of reading them
+        version - expected schema version of the cached data
+
+    Returns:
+        DataFrame, or None when the entry is missing, stale or from an older
+        format or schema version
+
+    """
+    entry = Path(cache_dir) / name
+    manifest_path = entry / 'manifest.json'
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION or manifest.get('version', 0) != version:
+        return None
+    if not _sources_match(manifest['sources'], [str(p) for p in source_paths]):
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for column in manifest['columns']:
+        values = np.load(entry / f"{column['file']}.npy", mmap_mode=mmap_mode)
+        if column['kind'] == 'category':
+            categories = np.load(entry / f"{column['file']}.categories.npy")
+            data[column['name']] = pd.Categorical.from_codes(values, categories=categories)
+        elif column['kind'] == 'datetime':
+            data[column['name']] = pd.to_datetime(np.asarray(values).astype('datetime64[D]'))
+        else:
+            data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
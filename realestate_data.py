@@ -1,35 +1,128 @@
+import re
+import numpy as np
 import pandas as pd
-import nasdaqdatalink
 from pathlib import Path
 import shutil
+import realestate_cache
+from realestate_panel import month_end_dates
+from realestate_instrument import instrumented
 
 
-nasdaqdatalink.read_key(filename=".env")
+# Source files
+ZILLOW_DATA_CSV = Path('ZILLOW_DATA_d5d2ff90eb7172dbde848ea36de12dfe.csv')
+COUNTY_COORDINATES_CSV = Path('counties_w_coordinates.csv')
 
-def get_regions(regions):    
+# Names of the cached DataFrames in the on-disk cache
+MASTER_REGIONS_CACHE_NAME = 'master_regions'
+MASTER_FACTS_CACHE_NAME = 'master_facts'
+SALES_CACHE_NAME = 'zillow_sales'
+
+# Bump when the columns of the cached master tables change
+MASTER_CACHE_VERSION = 2
+
+# Zillow indicator for single family home values
+ZILLOW_INDICATOR = 'ZSFH'
+
+
+_nasdaqdatalink = None
+
+
+def _nasdaq():
+    """
+    Returns the nasdaqdatalink module with the API key read from .env.
+
+    The SDK is imported and the key read on the first API call instead of at
+    import, so loading the app and reading the local cache do not pay for
+    either.
+    """
+    global _nasdaqdatalink
+    if _nasdaqdatalink is None:
+        import nasdaqdatalink
+        nasdaqdatalink.read_key(filename=".env")
+        _nasdaqdatalink = nasdaqdatalink
+    return _nasdaqdatalink
+
+
+class NasdaqZillowClient:
+    """
+    Reads the Zillow tables from Nasdaq Data Link.
+
+    Any object with the same get_regions and get_data methods can be passed
+    where a client is expected, e.g. LocalZillowClient in tests and benchmarks.
+    """
+
+    def get_regions(self, region_type):
+        """
+        Returns the ZILLOW/REGIONS rows for a region type, eg county, state.
+        """
+        return _nasdaq().get_table('ZILLOW/REGIONS', region_type=region_type)
+
+    def get_data(self, region_ids, indicator_id=ZILLOW_INDICATOR, after=None):
+        """
+        Returns the ZILLOW/DATA rows for the given regions, optionally only the
+        rows dated after `after`.
+        """
+        filters = {'indicator_id': indicator_id, 'region_id': [int(r) for r in region_ids]}
+        if after is not None:
+            filters['date'] = {'gt': pd.Timestamp(after).strftime('%Y-%m-%d')}
+        return _nasdaq().get_table('ZILLOW/DATA', paginate=True, **filters)
+
+
+class LocalZillowClient:
+    """
+    In-memory stand-in for NasdaqZillowClient, serving region and sales
+    DataFrames shaped like the ZILLOW/REGIONS and ZILLOW/DATA tables.
+    """
+
+    def __init__(self, region_df, data_df):
+        self.region_df = region_df
+        self.data_df = data_df
+        self.rows_served = 0
+
+    def get_regions(self, region_type):
+        return self.region_df[self.region_df['region_type'] == region_type].copy()
+
+    def get_data(self, region_ids, indicator_id=ZILLOW_INDICATOR, after=None):
+        data = self.data_df
+        mask = (data['indicator_id'] == indicator_id) & data['region_id'].isin(list(region_ids))
+        if after is not None:
+            mask &= pd.to_datetime(data['date']) > pd.Timestamp(after)
+        rows = data[mask].copy()
+        self.rows_served += len(rows)
+        return rows
+
+
+@instrumented
+def get_regions(regions, client=None):
     """
     Fetches a dataframe of Zillow region data (counties, states, etc) from Zillow's REST APIs.
     
     Parameters: 
         regions - the type of region to return, eg county, state 
+        client - Zillow API client, defaults to NasdaqZillowClient
         
     Returns: 
         DataFrame with Zillow region data
         
     """
-    region_df=nasdaqdatalink.get_table('ZILLOW/REGIONS', region_type=regions)  
+    client = client or NasdaqZillowClient()
+    region_df = client.get_regions(regions)
     return region_df
 
-def load_zillow_region_data():
+@instrumented
+def load_zillow_region_data(client=None):
     """
     Fetches Zillow county data and returns a cleaned up DataFrame.
+
+    Parameters: 
+        client - Zillow API client, defaults to NasdaqZillowClient
     
     Returns: 
         DataFrame with Zillow county data
         
     """
         
-    region_df = get_regions('county')
+    region_df = get_regions('county', client)
     region_df[["county", "state"]] = region_df["region"].str.split(';', 1, expand=True)
     region_df["state"] = region_df["state"].str.split(';', 1, expand=True)[0]
 
@@ -47,13 +140,16 @@ def load_zillow_region_data():
     return region_df
 
 
-def load_zillow_sales_data(region_df):
+@instrumented
+def load_zillow_sales_data(region_df, cache_dir=realestate_cache.CACHE_DIR):
     """
-    Loads Zillow sales data from a CSV file.  We then merge the Zillow sales 
-    data with the region DataFrame.
+    Loads Zillow sales data from the local sales store (seeded from the CSV
+    file, plus any rows added by sync_zillow_sales).  We then merge the Zillow
+    sales data with the region DataFrame.
     
     Parameters: 
         region_df - Zillow region DataFrame 
+        cache_dir - root directory of the on-disk cache
     
     Returns: 
         merged DataFrame with Zillow sales and region data.
@@ -61,9 +157,7 @@ def load_zillow_sales_data(region_df):
     """
     # A function to load and clean Zillow sales data
     # Reading in Database
-    zillow_data = pd.read_csv(
-        Path('ZILLOW_DATA_d5d2ff90eb7172dbde848ea36de12dfe.csv', parse_dates=['date'])
-    )
+    zillow_data = load_sales_store(cache_dir)
 
     # Merge the Region dataframe with the Zillow sales data
     zillow_merge_df = pd.merge(region_df, zillow_data, on=['region_id'])
@@ -72,19 +166,201 @@ def load_zillow_sales_data(region_df):
     return zillow_merge_df
 
 
-def get_zillow_data():
+def _sales_sources():
+    """
+    Source files of the sales store: the CSV export when there is one.
+    """
+    return [ZILLOW_DATA_CSV] if ZILLOW_DATA_CSV.exists() else []
+
+
+def _master_sources():
+    """
+    Source files of the cached master DataFrame.
+    """
+    return _sales_sources() + [COUNTY_COORDINATES_CSV]
+
+
+@instrumented
+def load_sales_store(cache_dir=realestate_cache.CACHE_DIR):
+    """
+    Loads the local Zillow sales store (region_id, date, value).
+
+    The store is seeded from the CSV export the first time, or whenever the
+    CSV changes, and is then extended by sync_zillow_sales.
+
+    Parameters: 
+        cache_dir - root directory of the on-disk cache
+
+    Returns: 
+        DataFrame with region_id, date and value sorted by region_id and date
+
+    """
+    sources = _sales_sources()
+    sales_df = realestate_cache.load_frame(SALES_CACHE_NAME, sources, cache_dir)
+    if sales_df is not None:
+        return sales_df
+
+    if sources:
+        sales_df = pd.read_csv(ZILLOW_DATA_CSV, parse_dates=['date'],
+                               usecols=['region_id', 'date', 'value'])
+    else:
+        sales_df = pd.DataFrame({'region_id': pd.Series(dtype=np.int32),
+                                 'date': pd.Series(dtype='datetime64[ns]'),
+                                 'value': pd.Series(dtype=np.float32)})
+    sales_df = _compact_sales(sales_df)
+    realestate_cache.save_frame(sales_df, SALES_CACHE_NAME, sources, cache_dir)
+    return sales_df
+
+
+def _compact_sales(sales_df):
+    """
+    Sorts sales rows by region and date and converts them to compact dtypes.
+    """
+    sales_df = sales_df[['region_id', 'date', 'value']].astype(
+        {'region_id': np.int32, 'value': np.float32})
+    sales_df['date'] = pd.to_datetime(sales_df['date'])
+    return sales_df.sort_values(['region_id', 'date'], kind='mergesort').reset_index(drop=True)
+
+
+@instrumented
+def sync_zillow_sales(region_df, client=None, cache_dir=realestate_cache.CACHE_DIR):
+    """
+    Incrementally updates the local sales store from the Zillow API.
+
+    The latest stored date is looked up per region and only newer rows are
+    requested, one request per distinct latest date (usually just one).
+    Regions with no stored rows get their full history.
+
+    Parameters: 
+        region_df - Zillow region DataFrame 
+        client - Zillow API client, defaults to NasdaqZillowClient
+        cache_dir - root directory of the on-disk cache
+
+    Returns: 
+        DataFrame with the newly added region_id, date and value rows
+
+    """
+    client = client or NasdaqZillowClient()
+    sales_df = load_sales_store(cache_dir)
+
+    latest = sales_df.groupby('region_id')['date'].max()
+    region_ids = pd.Series(region_df['region_id'].astype(int).unique())
+
+    queries = [(region_ids[~region_ids.isin(latest.index)], None)]
+    known = latest[latest.index.isin(region_ids)]
+    for after, ids in known.groupby(known).groups.items():
+        queries.append((ids, after))
+
+    fetched = [client.get_data(ids, ZILLOW_INDICATOR, after) for ids, after in queries if len(ids)]
+    fetched = [rows for rows in fetched if len(rows)]
+    if not fetched:
+        return sales_df.iloc[:0]
+
+    # Drop anything already stored, in case the API returns overlapping rows
+    new_rows = _compact_sales(pd.concat(fetched, ignore_index=True))
+    stored_until = new_rows['region_id'].map(latest).fillna(pd.Timestamp.min)
+    new_rows = new_rows[new_rows['date'] > stored_until]
+    new_rows = new_rows.drop_duplicates(['region_id', 'date']).reset_index(drop=True)
+    if new_rows.empty:
+        return new_rows
+
+    sales_df = _compact_sales(pd.concat([sales_df, new_rows], ignore_index=True))
+    realestate_cache.save_frame(sales_df, SALES_CACHE_NAME, _sales_sources(), cache_dir)
+    return new_rows
+
+
+@instrumented
+def refresh_master_df(client=None, cache_dir=realestate_cache.CACHE_DIR):
+    """
+    Syncs new Zillow rows from the API and adds only those rows to the
+    cached master tables instead of rebuilding them from the CSV files.
+
+    Parameters: 
+        client - Zillow API client, defaults to NasdaqZillowClient
+        cache_dir - root directory of the on-disk cache
+
+    Returns: 
+        tuple of (master DataFrame, DataFrame of newly synced sales rows)
+
+    """
+    region_df = load_zillow_region_data(client)
+    regions, facts = load_master_tables(cache_dir=cache_dir, region_df=region_df)
+    new_rows = sync_zillow_sales(region_df, client, cache_dir)
+    if new_rows.empty:
+        return join_master_df(regions, facts), new_rows
+
+    # Derive master rows for the new sales only and add them
+    county_table = load_county_table()
+    new_master_rows = compact_master_df(build_master_df(
+        new_rows, county_table, build_region_crosswalk(region_df, county_table)))
+    master_df = pd.concat([join_master_df(regions, facts), new_master_rows], ignore_index=True)
+    master_df = master_df.astype({'county': 'category', 'state': 'category'})
+    _save_master_tables(*split_master_df(master_df), cache_dir)
+    return master_df, new_rows
+
+
+@instrumented
+def get_zillow_data(region_df):
     """
     Get the Zillow sales data. 
     The actual API call using the SDK.
     Instructions can be found here https://data.nasdaq.com/databases/ZILLOW/usage/quickstart/python
     Replace 'quandl' w/ 'nasdaqdatalink
+
+    This downloads the full history for every region; sync_zillow_sales only
+    fetches the months that are not stored locally yet.
+
+    Parameters: 
+        region_df - Zillow region DataFrame 
     """
-    data = nasdaqdatalink.export_table('ZILLOW/DATA', indicator_id='ZSFH', region_id=list(region_df['region_id']),filename='db.zip')
+    data = _nasdaq().export_table('ZILLOW/DATA', indicator_id=ZILLOW_INDICATOR, region_id=list(region_df['region_id']),filename='db.zip')
     
     # Unzipping database from API call
     shutil.unpack_archive('db.zip')
     return data        
 
+# Maps the degree sign and plus sign away and the unicode en dash to a minus
+# sign, so Latitude/Longitude strings convert to float in one pass.
+_COORDINATE_TRANSLATION = str.maketrans({'°': None, '+': None, '\u2013': '-'})
+
+# Footnote markers such as "\xa0[2]" at the end of the CSV header names
+_FOOTNOTE_RE = re.compile(r'\s*\[\d+\]$')
+
+
+@instrumented
+def load_county_table():
+    """
+    Loads the county table from the coordinates CSV file, keyed by FIPS code.
+
+    The units row under the header is skipped, footnote markers are stripped
+    from the column and county names, and Latitude/Longitude are converted to
+    float32 with a single vectorized translate instead of chained replaces.
+
+    Returns: 
+        DataFrame indexed by fips (int32) with county, state, latitude and longitude
+
+    """
+    county_table = pd.read_csv(COUNTY_COORDINATES_CSV, skiprows=[1], dtype={'FIPS': 'Int64'})
+    county_table.columns = [_FOOTNOTE_RE.sub('', c) for c in county_table.columns]
+
+    # Independent cities (footnote 9) share names with counties, e.g. Fairfax
+    # County and Fairfax city in VA, so they get a " City" suffix
+    county = county_table['County']
+    independent_city = county.str.contains(r'\[9\]$') & ~county.str.contains(r'City\s*\[9\]$')
+    county = county.str.replace(_FOOTNOTE_RE, '', regex=True)
+    county = county.where(~independent_city, county + ' City')
+
+    county_table = pd.DataFrame({
+        'fips': county_table['FIPS'].astype(np.int32),
+        'county': county,
+        'state': county_table['State'],
+        'latitude': county_table['Latitude'].str.translate(_COORDINATE_TRANSLATION).astype(np.float32),
+        'longitude': county_table['Longitude'].str.translate(_COORDINATE_TRANSLATION).astype(np.float32),
+    })
+    return county_table.set_index('fips')
+
+
+@instrumented
 def load_county_coordinates():
     """
     Loads county coordinates data from a CSV file.  
@@ -93,50 +369,258 @@ def load_county_coordinates():
         DataFrame with county coordinates
         
     """
-    # Read in county data with coordinates
-    county_coordinates_df = pd.read_csv(
-        Path('counties_w_coordinates.csv')
-    )
-
-    # Clean up data.
-    # We need to rename the columns so that we can merge our Zillow data set
-    # with the county coordinates data.   The dataframes will be merged against 'county' and 'state'.
-    county_coordinates_df = county_coordinates_df.rename(
-        columns={"County\xa0[2]": "county"})
-    # county_coordinates_df = county_coordinates_df.rename(columns={"region" : "region"})
-    county_coordinates_df = county_coordinates_df.rename(
-        columns={"State": "state"})
-
-    # Remove degrees
-    county_coordinates_df["Latitude"] = county_coordinates_df["Latitude"].str.replace(
-        "°", "")
-    county_coordinates_df["Longitude"] = county_coordinates_df["Longitude"].str.replace(
-        "°", "")
-
-    # Remove + sign for Latitude and Longitude
-    county_coordinates_df["Latitude"] = county_coordinates_df["Latitude"].str.replace(
-        "+", "")
-    county_coordinates_df["Longitude"] = county_coordinates_df["Longitude"].str.replace(
-        "+", "")
-
-    # Some of the data uses unicode hyphens which causes problems when trying to convert the Longitude and Latitude to float.
-    county_coordinates_df["Latitude"] = county_coordinates_df["Latitude"].str.replace(
-        '\U00002013', '-')
-    county_coordinates_df["Longitude"] = county_coordinates_df["Longitude"].str.replace(
-        '\U00002013', '-')
-
-    # Convert Longitude and Latitude to float so we can display on the map.
-    county_coordinates_df["Latitude"] = county_coordinates_df["Latitude"].astype(
-        float)
-    county_coordinates_df["Longitude"] = county_coordinates_df["Longitude"].astype(
-        float)
-
-    # Rename column names
-    county_coordinates_df.rename(
-        columns={'Latitude': 'latitude', 'Longitude': 'longitude'}, inplace=True)
-    
-    # Drop unnecessary columns
-    county_coordinates_df = county_coordinates_df[['county', 'state', 'latitude', 'longitude']]
+    # The dataframes will be merged against 'county' and 'state'.
+    county_coordinates_df = load_county_table().reset_index(drop=True)
+
+    return county_coordinates_df[['county', 'state', 'latitude', 'longitude']]
+
+
+# Suffixes Zillow uses for county-equivalents that the county table leaves out
+_REGION_SUFFIX_RE = re.compile(
+    r'\s+(county|parish|borough|census area|city and borough|municipality|municipio)$')
+
+
+def _name_key(names):
+    """
+    Normalizes county names for matching: lower case, no accents or
+    punctuation, "Saint" spelled "St", single spaces and no county-type suffix.
+    """
+    keys = (names.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower()
+            .str.replace(r"[.']", '', regex=True)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .str.replace(r'^saint ', 'st ', regex=True)
+            .str.replace(_REGION_SUFFIX_RE, '', regex=True))
+    # "City of X" is the same place as "X City"
+    return keys.str.replace(r'^city of (.*)$', r'\1 city', regex=True)
+
+
+@instrumented
+def build_region_crosswalk(region_df, county_table):
+    """
+    Maps Zillow region_ids to county FIPS codes.
+
+    Zillow region names ("Orleans Parish; LA; New Orleans-Metairie, LA") and
+    the county table names are normalized the same way and matched once on
+    (name, state); everything downstream then joins on the integer codes.
+
+    Parameters:
+        region_df - DataFrame returned by load_zillow_region_data
+        county_table - DataFrame returned by load_county_table
+
+    Returns:
+        DataFrame with int32 region_id and fips for every matched region
+
+    """
+    parts = region_df['region'].str.split(';', expand=True)
+    regions = pd.DataFrame({
+        'region_id': region_df['region_id'].astype(np.int32).values,
+        'key': _name_key(parts[0]).values,
+        'state': parts[1].str.strip().values,
+    })
+    counties = pd.DataFrame({
+        'fips': county_table.index.values.astype(np.int32),
+        'key': _name_key(county_table['county']).values,
+        'state': county_table['state'].values,
+    }).drop_duplicates(['key', 'state'], keep=False)
+
+    crosswalk = regions.merge(counties, on=['key', 'state'])
+    return crosswalk[['region_id', 'fips']].drop_duplicates('region_id').reset_index(drop=True)
 
-    return county_coordinates_df
 
+@instrumented
+def build_master_df(zillow_df, county_table, crosswalk):
+    """
+    Joins the Zillow sales data (already merged with the regions) to the
+    county table through the region_id -> FIPS crosswalk, on integer keys.
+
+    Parameters:
+        zillow_df - DataFrame returned by load_zillow_sales_data
+        county_table - DataFrame returned by load_county_table
+        crosswalk - DataFrame returned by build_region_crosswalk
+
+    Returns:
+        DataFrame with region_id, fips, county, state, date, value, latitude and longitude
+
+    """
+    # Look up each row's FIPS code, then its county attributes, by position
+    fips = pd.Series(crosswalk['fips'].values, index=crosswalk['region_id'].values)
+    row_fips = fips.reindex(zillow_df['region_id'].values).values
+    matched = ~np.isnan(row_fips)
+    row_fips = row_fips[matched].astype(np.int32)
+    counties = county_table.iloc[county_table.index.get_indexer(row_fips)]
+
+    master_df = pd.DataFrame({
+        'region_id': zillow_df['region_id'].values[matched],
+        'fips': row_fips,
+        'county': counties['county'].values,
+        'state': counties['state'].values,
+        'date': pd.to_datetime(zillow_df['date'].values[matched]),
+        'value': zillow_df['value'].values[matched],
+        'latitude': counties['latitude'].values,
+        'longitude': counties['longitude'].values,
+    })
+
+    return master_df
+
+
+@instrumented
+def compact_master_df(master_df):
+    """
+    Converts the master DataFrame to compact dtypes: categorical county and
+    state, int32 region_id and fips, and float32 value, latitude and longitude.
+
+    Parameters:
+        master_df - DataFrame returned by build_master_df
+
+    Returns:
+        DataFrame with the same columns in compact dtypes
+
+    """
+    return master_df.astype({
+        'region_id': np.int32,
+        'fips': np.int32,
+        'county': 'category',
+        'state': 'category',
+        'value': np.float32,
+        'latitude': np.float32,
+        'longitude': np.float32,
+    })
+
+
+@instrumented
+def split_master_df(master_df):
+    """
+    Splits the master DataFrame into a small region dimension table and a
+    compact fact table.
+
+    The county attributes (names, FIPS code, coordinates) are stored once per
+    region instead of on every monthly row, and each fact row holds only a
+    region code, a month number and the value.  Dates are kept to the month.
+
+    Parameters:
+        master_df - DataFrame returned by build_master_df or compact_master_df
+
+    Returns:
+        tuple of (regions, facts):
+            regions - one row per region sorted by region_id, with region_id,
+                fips, county, state, latitude and longitude; its row number
+                is the region_code
+            facts - region_code (int16, or int32 for more than 32767
+                regions), month (int16, months since 1970-01) and value
+                (float32), sorted by region_code and month
+    """
+    regions = master_df[['region_id', 'fips', 'county', 'state', 'latitude', 'longitude']]
+    regions = regions.drop_duplicates('region_id').sort_values('region_id').reset_index(drop=True)
+    regions = regions.astype({'region_id': np.int32, 'fips': np.int32, 'county': str, 'state': str,
+                              'latitude': np.float32, 'longitude': np.float32})
+
+    code_dtype = np.int16 if len(regions) <= np.iinfo(np.int16).max else np.int32
+    region_code = pd.Index(regions['region_id']).get_indexer(master_df['region_id']).astype(code_dtype)
+    month = master_df['date'].values.astype('datetime64[M]').astype(np.int64).astype(np.int16)
+
+    order = np.lexsort((month, region_code))
+    facts = pd.DataFrame({
+        'region_code': region_code[order],
+        'month': month[order],
+        'value': master_df['value'].values.astype(np.float32)[order],
+    })
+    return regions, facts
+
+
+@instrumented
+def join_master_df(regions, facts):
+    """
+    Rebuilds the long master DataFrame from the normalized tables, for code
+    that still needs one row per region and month.
+
+    Parameters:
+        regions - region dimension table returned by split_master_df
+        facts - fact table returned by split_master_df
+
+    Returns:
+        DataFrame with region_id, fips, county, state, date (month end),
+        value, latitude and longitude in compact dtypes
+    """
+    codes = facts['region_code'].values
+    data = {}
+    for column in ['region_id', 'fips', 'county', 'state']:
+        if column in ['county', 'state']:
+            categories = regions[column].astype('category')
+            data[column] = pd.Categorical.from_codes(
+                categories.cat.codes.values[codes], categories.cat.categories)
+        else:
+            data[column] = regions[column].values[codes]
+    data['date'] = month_end_dates(facts['month'].values)
+    data['value'] = facts['value'].values
+    data['latitude'] = regions['latitude'].values[codes]
+    data['longitude'] = regions['longitude'].values[codes]
+    return pd.DataFrame(data)
+
+
+def _save_master_tables(regions, facts, cache_dir):
+    sources = _master_sources()
+    realestate_cache.save_frame(regions, MASTER_REGIONS_CACHE_NAME, sources, cache_dir,
+                                version=MASTER_CACHE_VERSION)
+    realestate_cache.save_frame(facts, MASTER_FACTS_CACHE_NAME, sources, cache_dir,
+                                version=MASTER_CACHE_VERSION)
+
+
+@instrumented
+def load_master_tables(refresh=False, cache_dir=realestate_cache.CACHE_DIR, region_df=None):
+    """
+    Loads the normalized master tables, using the on-disk columnar cache when
+    the Zillow and county coordinate CSV files have not changed.
+
+    The fact table is memory-mapped from the cache, so its columns are
+    read-only views on pages the OS shares between worker processes.  On a
+    cache miss the regions are fetched from the API, the CSV files are parsed
+    and merged, and both tables are cached.
+
+    Parameters:
+        refresh - rebuild the cache even if it is up to date
+        cache_dir - root directory of the on-disk cache
+        region_df - Zillow region DataFrame, fetched from the API if needed and not given
+
+    Returns:
+        tuple of (regions, facts), see split_master_df
+
+    """
+    sources = _master_sources()
+
+    if not refresh:
+        regions = realestate_cache.load_frame(MASTER_REGIONS_CACHE_NAME, sources, cache_dir,
+                                              version=MASTER_CACHE_VERSION)
+        facts = realestate_cache.load_frame(MASTER_FACTS_CACHE_NAME, sources, cache_dir,
+                                            version=MASTER_CACHE_VERSION)
+        if regions is not None and facts is not None:
+            return regions, facts
+
+    if region_df is None:
+        region_df = load_zillow_region_data()
+    zillow_df = load_zillow_sales_data(region_df, cache_dir)
+    county_table = load_county_table()
+    crosswalk = build_region_crosswalk(region_df, county_table)
+
+    regions, facts = split_master_df(build_master_df(zillow_df, county_table, crosswalk))
+    _save_master_tables(regions, facts, cache_dir)
+    return regions, facts
+
+
+@instrumented
+def load_master_df(refresh=False, cache_dir=realestate_cache.CACHE_DIR, region_df=None):
+    """
+    Loads the merged master DataFrame, joined from the cached normalized
+    tables (see load_master_tables).
+
+    Parameters:
+        refresh - rebuild the cache even if it is up to date
+        cache_dir - root directory of the on-disk cache
+        region_df - Zillow region DataFrame, fetched from the API if needed and not given
+
+    Returns:
+        DataFrame with region_id, fips, county, state, date, value, latitude and longitude
+
+    """
+    return join_master_df(*load_master_tables(refresh, cache_dir, region_df))
@@ -0,0 +1,324 @@
+"""
+Batch Monte Carlo forecast of every county, ranked by simulated return.
+
+Runs the app's Monte Carlo simulation (MCSimulation) for each county on its
+own over the same history window and horizon, spread over a process pool.
+Finished batches are checkpointed, so an interrupted run started again with
+the same arguments only simulates the counties that are left.  Usage:
+
+    python realestate_forecast.py --output forecast.csv
+    python realestate_forecast.py --states CA,OR,WA --output west.parquet --workers 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+from pathlib import Path
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from MCForecastTools import MCSimulation
+from realestate_jobs import monte_carlo_input
+
+
+# Same history window and horizon as the app's Monte Carlo section
+DEFAULT_START_DATE = '2015-01-31'
+DEFAULT_END_DATE = '2022-06-30'
+DEFAULT_HORIZON = 120
+
+# Counties with fewer months of history in the window are not simulated
+MIN_MONTHS = 24
+
+# Counties per task sent to a worker, and per checkpoint file
+BATCH_SIZE = 50
+
+# Columns of the forecast table; returns are in percent over the horizon
+FORECAST_COLUMNS = ['region_id', 'county', 'state', 'months', 'median_return', 'mean_return',
+                    'ci_lower', 'ci_upper', 'prob_loss']
+
+# Panel of the worker processes, set once per worker by _init_worker
+_worker_panel = None
+
+
+def forecast_county(panel, county, start_date, end_date, num_simulations=1000,
+                    horizon=DEFAULT_HORIZON, seed=0, min_months=MIN_MONTHS):
+    """
+    Simulates one county and summarizes its final cumulative returns.
+
+    Every county gets its own seed derived from (seed, region_id), so its
+    result does not depend on the batch or worker it ran in.
+
+    Parameters:
+        panel - ValuePanel
+        county - region_id or "county, state" label
+        start_date - first date of the history the returns are drawn from
+        end_date - last date of the history (inclusive)
+        num_simulations - number of simulations
+        horizon - months simulated
+        seed - seed of the run
+        min_months - fewer months of history than this leaves the returns NaN
+
+    Returns:
+        dict with the FORECAST_COLUMNS
+    """
+    row = panel.regions.iloc[panel.position(county)]
+    monte_carlo_df = monte_carlo_input(panel, [row['label']], start_date, end_date)
+    forecast = {
+        'region_id': int(row['region_id']),
+        'county': row['county'],
+        'state': row['state'],
+        'months': len(monte_carlo_df),
+        'median_return': np.nan,
+        'mean_return': np.nan,
+        'ci_lower': np.nan,
+        'ci_upper': np.nan,
+        'prob_loss': np.nan,
+    }
+    if len(monte_carlo_df) < max(min_months, 3):
+        return forecast
+
+    simulation = MCSimulation(monte_carlo_df, "", num_simulations, horizon,
+                              seed=[seed, forecast['region_id']])
+    simulation.calc_cumulative_return()
+    final_returns = simulation.final_returns.to_numpy()
+
+    forecast['median_return'] = (np.median(final_returns) - 1) * 100
+    forecast['mean_return'] = (final_returns.mean() - 1) * 100
+    forecast['ci_lower'] = (simulation.confidence_interval.iloc[0] - 1) * 100
+    forecast['ci_upper'] = (simulation.confidence_interval.iloc[1] - 1) * 100
+    forecast['prob_loss'] = (final_returns < 1).mean()
+    return forecast
+
+
+def _init_worker(panel):
+    global _worker_panel
+    _worker_panel = panel
+
+
+def _forecast_batch(region_ids, params, panel=None):
+    """
+    Forecasts a batch of counties, in a worker process unless a panel is given.
+    """
+    panel = _worker_panel if panel is None else panel
+    return [forecast_county(panel, region_id, **params) for region_id in region_ids]
+
+
+def select_counties(panel, counties=None, states=None):
+    """
+    Returns the region_ids to forecast: the given counties, the counties of
+    the given states, or every county of the panel.
+
+    Parameters:
+        panel - ValuePanel
+        counties - list of region_ids or "county, state" labels, or None
+        states - list of state codes, or None
+
+    Returns:
+        list of region_ids
+    """
+    regions = panel.regions
+    if counties is not None:
+        return [int(regions['region_id'].iat[panel.position(county)]) for county in counties]
+    if states is not None:
+        regions = regions[regions['state'].isin(states)]
+    return regions['region_id'].astype(int).tolist()
+
+
+def read_checkpoint(checkpoint_dir, params):
+    """
+    Reads the forecasts of an earlier, interrupted run.
+
+    Parameters:
+        checkpoint_dir - directory the run checkpointed its batches to
+        params - parameters of the current run; they must match the ones the
+            checkpoint was written with
+
+    Returns:
+        DataFrame of the checkpointed forecasts (empty without a checkpoint)
+    """
+    checkpoint_dir = Path(checkpoint_dir)
+    params_path = checkpoint_dir / 'params.json'
+    if not params_path.exists():
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+
+    with open(params_path) as f:
+        saved = json.load(f)
+    if saved != params:
+        raise ValueError(f"checkpoint {checkpoint_dir} was written with different parameters "
+                         f"{saved}; remove it or pass another --checkpoint")
+
+    parts = sorted(checkpoint_dir.glob('part-*.csv'))
+    if not parts:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    return pd.concat([pd.read_csv(part, float_precision='round_trip') for part in parts],
+                     ignore_index=True)
+
+
+def _next_part(checkpoint_dir):
+    # One past the highest part written so far, so a resumed run never
+    # overwrites a part even when an earlier one is missing
+    indexes = [int(path.stem[len('part-'):]) for path in Path(checkpoint_dir).glob('part-*.csv')]
+    return max(indexes, default=-1) + 1
+
+
+def _write_checkpoint(checkpoint_dir, part, forecasts):
+    # Written to a temporary file and renamed, so a killed run never leaves a
+    # partial batch behind; '%.17g' keeps the floats exact, so a resumed run
+    # matches an uninterrupted one
+    path = Path(checkpoint_dir) / f'part-{part:05d}.csv'
+    temporary = path.with_suffix('.tmp')
+    pd.DataFrame(forecasts, columns=FORECAST_COLUMNS).to_csv(temporary, index=False,
+                                                             float_format='%.17g')
+    os.replace(temporary, path)
+
+
+def rank_forecasts(forecasts):
+    """
+    Ranks forecasts by median return, best first.  Counties that were not
+    simulated are listed last without a rank.
+
+    Parameters:
+        forecasts - DataFrame with the FORECAST_COLUMNS
+
+    Returns:
+        DataFrame with a rank column first, best county first
+    """
+    ranked = forecasts.sort_values(['median_return', 'prob_loss', 'region_id'],
+                                   ascending=[False, True, True], na_position='last')
+    ranked = ranked.reset_index(drop=True)
+    ranked.insert(0, 'rank', pd.Series(np.arange(1, len(ranked) + 1), dtype='Int64'))
+    ranked.loc[ranked['median_return'].isna(), 'rank'] = pd.NA
+    return ranked
+
+
+def run_batch_forecast(panel, counties=None, states=None, start_date=DEFAULT_START_DATE,
+                       end_date=DEFAULT_END_DATE, num_simulations=1000, horizon=DEFAULT_HORIZON,
+                       seed=0, min_months=MIN_MONTHS, workers=None, batch_size=BATCH_SIZE,
+                       checkpoint_dir=None, progress=None):
+    """
+    Forecasts many counties and ranks them by median simulated return.
+
+    Parameters:
+        panel - ValuePanel
+        counties, states - counties to forecast, see select_counties
+        start_date, end_date - history window (end inclusive)
+        num_simulations - simulations per county
+        horizon - months simulated
+        seed - seed of the run
+        min_months - minimum months of history to simulate a county
+        workers - worker processes, default os.cpu_count(); 1 runs in-process
+        batch_size - counties per task and per checkpoint file
+        checkpoint_dir - directory to checkpoint finished batches to and
+            resume from, or None
+        progress - optional function called as progress(done, total) after
+            each batch
+
+    Returns:
+        DataFrame of ranked forecasts, see rank_forecasts
+    """
+    region_ids = select_counties(panel, counties, states)
+    params = {
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'num_simulations': int(num_simulations),
+        'horizon': int(horizon),
+        'seed': int(seed),
+        'min_months': int(min_months),
+    }
+
+    finished = [pd.DataFrame(columns=FORECAST_COLUMNS)]
+    part = 0
+    if checkpoint_dir is not None:
+        finished.append(read_checkpoint(checkpoint_dir, params))
+        part = _next_part(checkpoint_dir)
+        Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
+        with open(Path(checkpoint_dir) / 'params.json', 'w') as f:
+            json.dump(params, f)
+
+    done = set(pd.concat(finished)['region_id'].astype(int))
+    remaining = [region_id for region_id in region_ids if region_id not in done]
+    batches = [remaining[i:i + batch_size] for i in range(0, len(remaining), batch_size)]
+    total = len(region_ids)
+    completed = total - len(remaining)
+    if progress is not None:
+        progress(completed, total)
+
+    def finish(forecasts):
+        nonlocal part, completed
+        if checkpoint_dir is not None:
+            _write_checkpoint(checkpoint_dir, part, forecasts)
+            part += 1
+        finished.append(pd.DataFrame(forecasts, columns=FORECAST_COLUMNS))
+        completed += len(forecasts)
+        if progress is not None:
+            progress(completed, total)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(batches) <= 1:
+        for batch in batches:
+            finish(_forecast_batch(batch, params, panel))
+    else:
+        # The panel is sent to each worker once instead of with every batch
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(panel,)) as pool:
+            futures = [pool.submit(_forecast_batch, batch, params) for batch in batches]
+            for future in as_completed(futures):
+                finish(future.result())
+
+    forecasts = pd.concat(finished, ignore_index=True)
+    forecasts = forecasts[forecasts['region_id'].astype(int).isin(region_ids)]
+    return rank_forecasts(forecasts.astype({'region_id': int, 'months': int}))
+
+
+def write_forecasts(ranked, path):
+    """
+    Writes ranked forecasts as Parquet (for a .parquet path, needs pyarrow or
+    fastparquet) or CSV.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        ranked.to_parquet(path, index=False)
+    else:
+        ranked.to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank counties by simulated return.')
+    parser.add_argument('--states', help='comma-separated state codes, default every county')
+    parser.add_argument('--start', default=DEFAULT_START_DATE, help='first date of the history')
+    parser.add_argument('--end', default=DEFAULT_END_DATE, help='last date of the history')
+    parser.add_argument('--simulations', type=int, default=1000, help='simulations per county')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='months simulated')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-months', type=int, default=MIN_MONTHS,
+                        help='months of history needed to simulate a county')
+    parser.add_argument('--workers', type=int, help='worker processes, default one per CPU')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--output', default='forecast.csv', help='.csv or .parquet file')
+    parser.add_argument('--checkpoint',
+                        help='checkpoint directory, default <output>.checkpoint next to the output')
+    parser.add_argument('--top', type=int, default=10, help='counties printed when done')
+    args = parser.parse_args()
+
+    # Only imported here: loading the data reads the API key and the cache
+    import realestate_access as rea
+
+    checkpoint_dir = args.checkpoint or f'{args.output}.checkpoint'
+
+    def report(done, total):
+        print(f'\r{done}/{total} counties', end='', flush=True)
+
+    ranked = run_batch_forecast(
+        rea.panel(), states=args.states.split(',') if args.states else None,
+        start_date=args.start, end_date=args.end, num_simulations=args.simulations,
+        horizon=args.horizon, seed=args.seed, min_months=args.min_months,
+        workers=args.workers, batch_size=args.batch_size, checkpoint_dir=checkpoint_dir,
+        progress=report)
+    print()
+
+    write_forecasts(ranked, args.output)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    print(f'Wrote {args.output}')
+    print(ranked.head(args.top).to_string(index=False))
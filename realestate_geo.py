@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# scipy is optional: its KD-tree is used when installed, otherwise queries fall
+# back to an exact vectorized scan, which is still fast for ~3100 counties.
+# scipy.spatial takes a few hundred milliseconds to import, so it is only
+# imported when the first index is built.
+_cKDTree = None
+
+
+def _kdtree_class():
+    """
+    Returns scipy's cKDTree, or False when scipy is not installed.
+    """
+    global _cKDTree
+    if _cKDTree is None:
+        try:
+            from scipy.spatial import cKDTree
+            _cKDTree = cKDTree
+        except ImportError:
+            _cKDTree = False
+    return _cKDTree
+
+
+def _unit_vectors(latitude, longitude):
+    """
+    Converts latitude/longitude in degrees to points on the unit sphere.
+    """
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _km_to_chord(km):
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class CountySpatialIndex:
+    """
+    Spatial index over county centroids for radius and nearest-neighbour queries.
+
+    Counties are stored as points on the unit sphere, so straight-line (chord)
+    distance orders points exactly like great-circle distance and a KD-tree
+    can be used.  Distances are reported in kilometres along the surface.
+
+    Attributes:
+        fips - int32 FIPS code of each county
+        latitude, longitude - float32 coordinates of each county
+    """
+
+    def __init__(self, fips, latitude, longitude):
+        self.fips = np.asarray(fips, dtype=np.int32)
+        self.latitude = np.asarray(latitude, dtype=np.float32)
+        self.longitude = np.asarray(longitude, dtype=np.float32)
+        self._points = _unit_vectors(self.latitude, self.longitude)
+        tree_class = _kdtree_class()
+        self._tree = tree_class(self._points) if tree_class else None
+        self._positions = pd.Index(self.fips)
+
+    @classmethod
+    def from_county_table(cls, county_table):
+        """
+        Builds the index from a FIPS-indexed county table (see red.load_county_table).
+        """
+        return cls(county_table.index.values, county_table['latitude'].values,
+                   county_table['longitude'].values)
+
+    def location(self, fips):
+        """
+        Returns (latitude, longitude) of a county.
+        """
+        position = self._positions.get_loc(fips)
+        return float(self.latitude[position]), float(self.longitude[position])
+
+    def within(self, latitude, longitude, radius_km):
+        """
+        Counties whose centroid is within `radius_km` of a point.
+
+        Returns:
+            DataFrame with fips and distance_km, nearest first
+        """
+        point = _unit_vectors([latitude], [longitude])[0]
+        chord = _km_to_chord(radius_km)
+        if self._tree is not None:
+            positions = np.asarray(self._tree.query_ball_point(point, chord), dtype=np.int64)
+            distances = np.linalg.norm(self._points[positions] - point, axis=1)
+        else:
+            all_distances = np.linalg.norm(self._points - point, axis=1)
+            positions = np.flatnonzero(all_distances <= chord)
+            distances = all_distances[positions]
+        return self._result(positions, distances)
+
+    def nearest(self, latitude, longitude, k=10):
+        """
+        The `k` counties nearest to a point.
+
+        Returns:
+            DataFrame with fips and distance_km, nearest first
+        """
+        point = _unit_vectors([latitude], [longitude])[0]
+        k = min(k, len(self.fips))
+        if self._tree is not None:
+            distances, positions = self._tree.query(point, k=k)
+            distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+        else:
+            all_distances = np.linalg.norm(self._points - point, axis=1)
+            positions = np.argpartition(all_distances, k - 1)[:k]
+            distances = all_distances[positions]
+        return self._result(positions, distances)
+
+    def neighbors(self, fips, k=10, include_self=False):
+        """
+        The `k` counties nearest to a county, e.g. for comparable-market analysis.
+
+        Returns:
+            DataFrame with fips and distance_km, nearest first
+        """
+        result = self.nearest(*self.location(fips), k=k + (0 if include_self else 1))
+        if not include_self:
+            result = result[result['fips'] != fips].head(k).reset_index(drop=True)
+        return result
+
+    def _result(self, positions, distances):
+        order = np.argsort(distances, kind='stable')
+        return pd.DataFrame({
+            'fips': self.fips[positions[order]],
+            'distance_km': _chord_to_km(distances[order]),
+        })
@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+import pandas as pd
+
+# resource is Unix-only; without it memory snapshots report None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Instrumentation is switched on at startup with REALESTATE_PROFILE=1.  When it
+# is off, `instrumented` returns functions unchanged and `timed` returns a
+# shared no-op context manager, so the hooks cost nothing.
+ENABLED = os.environ.get('REALESTATE_PROFILE', '') not in ('', '0')
+
+# Optional JSON-lines file every timing record is appended to
+LOG_PATH = os.environ.get('REALESTATE_PROFILE_LOG')
+
+_NOOP = nullcontext()
+
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 2 ** 20 if hasattr(os, 'sysconf') else None
+
+# Per-thread (i.e. per Streamlit script run) records and open timers
+_rerun = threading.local()
+_rerun_counter = 0
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def memory_snapshot():
+    """
+    Returns the current and peak resident memory of the process.
+
+    Returns:
+        dict with rss_mb (None where /proc is not available) and max_rss_mb
+        (None without the resource module)
+    """
+    rss_mb = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss_mb = int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        pass
+
+    max_rss_mb = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        max_rss_mb = max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10
+    return {'rss_mb': rss_mb, 'max_rss_mb': max_rss_mb}
+
+
+class _Timer:
+    """
+    Context manager recording the time and memory change of a block.
+    """
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        state = _state()
+        self.depth = len(state.stack)
+        self.child_seconds = 0.0
+        state.stack.append(self)
+        self.memory = memory_snapshot()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        memory = memory_snapshot()
+        state = _state()
+        state.stack.pop()
+        if state.stack:
+            state.stack[-1].child_seconds += elapsed
+
+        before, after = self.memory['rss_mb'], memory['rss_mb']
+        record = {
+            'rerun': state.rerun,
+            'name': self.name,
+            'kind': self.kind,
+            'depth': self.depth,
+            'start': self.start - state.started,
+            'seconds': elapsed,
+            'self_seconds': elapsed - self.child_seconds,
+            'rss_mb': after,
+            'rss_delta_mb': None if before is None or after is None else after - before,
+            'max_rss_mb': memory['max_rss_mb'],
+            'error': None if exc_type is None else exc_type.__name__,
+        }
+        state.records.append(record)
+        _write(record)
+        return False
+
+
+def _state():
+    if not hasattr(_rerun, 'records'):
+        _rerun.rerun = None
+        _rerun.records = []
+        _rerun.stack = []
+        _rerun.started = time.perf_counter()
+    return _rerun
+
+
+def _write(record):
+    global _sink
+    if not LOG_PATH:
+        return
+    with _sink_lock:
+        if _sink is None:
+            _sink = open(LOG_PATH, 'a', buffering=1)
+        _sink.write(json.dumps(record) + '\n')
+
+
+def timed(name, kind='section'):
+    """
+    Times a block of code, e.g. a section of the app:
+
+        with timed('Average Home Sales'):
+            ...
+
+    Parameters:
+        name - name the timing is recorded under
+        kind - 'section' for app sections, 'call' for functions
+
+    Returns:
+        context manager (a shared no-op one when instrumentation is off)
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Timer(name, kind)
+
+
+def instrumented(fn):
+    """
+    Decorator timing every call of a function under "module.qualname".
+
+    Returns the function unchanged when instrumentation is off.  Cache
+    helpers of lru_cache-wrapped functions stay available on the wrapper.
+    """
+    if not ENABLED:
+        return fn
+
+    name = f'{fn.__module__}.{fn.__qualname__}'
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _Timer(name, 'call'):
+            return fn(*args, **kwargs)
+
+    for attribute in ('cache_clear', 'cache_info'):
+        if hasattr(fn, attribute):
+            setattr(wrapper, attribute, getattr(fn, attribute))
+    return wrapper
+
+
+def start_rerun():
+    """
+    Starts a new set of records for the current script run.
+    """
+    global _rerun_counter
+    state = _state()
+    _rerun_counter += 1
+    state.rerun = _rerun_counter
+    state.records = []
+    state.stack = []
+    state.started = time.perf_counter()
+
+
+def rerun_records():
+    """
+    Returns the timing records of the current script run, in completion order.
+
+    Returns:
+        DataFrame with one row per timed section or call
+    """
+    return pd.DataFrame(_state().records, columns=[
+        'rerun', 'name', 'kind', 'depth', 'start', 'seconds', 'self_seconds',
+        'rss_mb', 'rss_delta_mb', 'max_rss_mb', 'error'])
+
+
+def rerun_summary():
+    """
+    Summarizes the current script run per section or function.
+
+    Returns:
+        DataFrame indexed by name with calls, total seconds, self seconds
+        (excluding nested timings) and memory growth, slowest first
+    """
+    records = rerun_records()
+    summary = records.groupby('name').agg(
+        kind=('kind', 'first'),
+        calls=('seconds', 'size'),
+        seconds=('seconds', 'sum'),
+        self_seconds=('self_seconds', 'sum'),
+        rss_delta_mb=('rss_delta_mb', 'sum'),
+    )
+    return summary.sort_values('self_seconds', ascending=False)
@@ -0,0 +1,200 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from MCForecastTools import MCSimulation
+
+
+# Background executor shared by every session of the Streamlit process.  The
+# simulations are NumPy-bound, so a couple of threads keep the script thread
+# responsive without competing with each other too much.
+MAX_WORKERS = 2
+
+# Number of Monte Carlo jobs (running or finished) kept, least recently used
+# first out.  Running jobs are never evicted.
+MAX_JOBS = 16
+
+# Simulations per progress update
+CHUNK_SIZE = 100
+
+_executor = None
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+class MonteCarloJob:
+    """
+    A Monte Carlo simulation running, or finished, in the background.
+
+    Attributes:
+        key - (panel, counties, start_date, end_date, num_simulations, horizon, seed)
+        done, total - simulations finished so far and in total
+        simulation - the MCSimulation, with its results once finished
+        error - exception raised by the simulation, if any
+        seconds - run time once finished
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.done = 0
+        self.total = key[4]
+        self.simulation = None
+        self.error = None
+        self.seconds = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 1.0
+
+    def result(self, timeout=None):
+        """
+        Waits for the job and returns its MCSimulation, re-raising any error.
+        """
+        self.future.result(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.simulation
+
+    def _progress(self, done, total):
+        self.done = done
+
+    def _run(self, panel, counties, start_date, end_date, num_simulations, horizon, seed):
+        started = time.perf_counter()
+        try:
+            monte_carlo_df = monte_carlo_input(panel, counties, start_date, end_date)
+            simulation = MCSimulation(monte_carlo_df, "", num_simulations, horizon,
+                                      chunk_size=CHUNK_SIZE, seed=_job_seed(self.key))
+            simulation.calc_cumulative_return(progress=self._progress)
+            self.simulation = simulation
+        except Exception as e:
+            self.error = e
+            # Failed jobs are not kept, so submitting the same parameters again
+            # retries instead of returning this job's error
+            with _lock:
+                if _jobs.get(self.key) is self:
+                    del _jobs[self.key]
+        finally:
+            self.seconds = time.perf_counter() - started
+
+
+def monte_carlo_input(panel, counties, start_date, end_date):
+    """
+    Builds the MCSimulation input for a set of counties.
+
+    Parameters:
+        panel - ValuePanel
+        counties - list of region_ids or "county, state" labels
+        start_date - first date to include
+        end_date - last date to include
+
+    Returns:
+        DataFrame with a (county, column) MultiIndex on the columns
+    """
+    # Each county is a contiguous slice of the panel; the end date is inclusive.
+    frames = [panel.region_frame(county, start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1))
+              .reset_index() for county in counties]
+    return pd.concat(frames, axis=1, keys=list(counties))
+
+
+def submit_monte_carlo(panel, counties, start_date, end_date, num_simulations=1000,
+                       horizon=120, seed=0):
+    """
+    Starts a Monte Carlo simulation in the background, or returns the job
+    already started with the same parameters.
+
+    Jobs are keyed by (panel, counties, date window, num_simulations,
+    horizon, seed), so selecting the same counties again reuses the running
+    or finished job instead of simulating again; a job that failed is
+    forgotten, so submitting it again retries.  Every job draws from its
+    own generator seeded from its key (see _job_seed), never from the global
+    NumPy random state the pool threads would share, so a job's result is
+    reproducible.
+
+    Parameters:
+        panel - ValuePanel
+        counties - list of region_ids or "county, state" labels
+        start_date - first date of the history the returns are drawn from
+        end_date - last date of the history (inclusive)
+        num_simulations - number of simulations
+        horizon - months simulated
+        seed - seed of the run, combined with the other parameters into the
+            seed of the job
+
+    Returns:
+        MonteCarloJob
+    """
+    global _executor
+    key = _job_key(panel, counties, start_date, end_date, num_simulations, horizon, seed)
+
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None:
+            _jobs.move_to_end(key)
+            return job
+
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix='monte-carlo')
+        job = MonteCarloJob(key)
+        job.future = _executor.submit(job._run, *key)
+        _jobs[key] = job
+        _evict()
+    return job
+
+
+def _job_key(panel, counties, start_date, end_date, num_simulations, horizon, seed):
+    return (panel, tuple(counties), str(start_date), str(end_date),
+            int(num_simulations), int(horizon), int(seed))
+
+
+def _job_seed(key):
+    """
+    Seed of a job's MCSimulation: the run seed and a digest of the job's
+    parameters.  crc32 rather than hash() so it is the same in every process.
+    """
+    _, counties, start_date, end_date, num_simulations, horizon, seed = key
+    parameters = repr(([str(county) for county in counties], start_date, end_date,
+                       num_simulations, horizon))
+    return [seed, zlib.crc32(parameters.encode())]
+
+
+def _evict():
+    """
+    Drops the least recently used finished jobs beyond MAX_JOBS.
+    """
+    for key in list(_jobs):
+        if len(_jobs) <= MAX_JOBS:
+            break
+        if _jobs[key].finished:
+            del _jobs[key]
+
+
+def find_monte_carlo(panel, counties, start_date, end_date, num_simulations=1000,
+                     horizon=120, seed=0):
+    """
+    Returns the job for these parameters if one was submitted, else None.
+    """
+    key = _job_key(panel, counties, start_date, end_date, num_simulations, horizon, seed)
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None:
+            _jobs.move_to_end(key)
+        return job
+
+
+def clear():
+    """
+    Forgets every finished job, e.g. after refreshing the data.
+    """
+    with _lock:
+        for key in [key for key, job in _jobs.items() if job.finished]:
+            del _jobs[key]
@@ -0,0 +1,189 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import realestate_stats as res
+
+
+# Positions are rounded to 3 decimals (~100 m), far finer than a county
+# centroid needs, so each coordinate serializes as a short JSON number.
+POSITION_DECIMALS = 3
+
+# Map values are rounded to one decimal for the same reason.
+VALUE_DECIMALS = 1
+
+
+def county_records(panel, df, value_column, decimals=VALUE_DECIMALS):
+    """
+    Builds compact ScatterplotLayer records for a per-county result.
+
+    Streamlit serializes pydeck data as JSON records, so the payload is kept
+    to the three fields the layer and tooltip read: the "county, state" name,
+    a quantized [longitude, latitude] position and the rounded value.
+    Counties without coordinates or without a value are left out.
+
+    Parameters:
+        panel - ValuePanel the result was computed from
+        df - DataFrame with region_id and `value_column`
+        value_column - column drawn as the circle radius
+        decimals - decimals kept for the value
+
+    Returns:
+        list of dicts with name, position and value
+    """
+    rows = pd.Index(panel.regions['region_id']).get_indexer(df['region_id'])
+    regions = panel.regions.iloc[rows]
+    longitude = regions['longitude'].to_numpy(dtype=np.float64)
+    latitude = regions['latitude'].to_numpy(dtype=np.float64)
+    values = df[value_column].to_numpy(dtype=np.float64)
+
+    keep = (rows >= 0) & np.isfinite(longitude) & np.isfinite(latitude) & np.isfinite(values)
+    return _records(regions['label'].to_numpy()[keep], longitude[keep], latitude[keep],
+                    values[keep], decimals)
+
+
+def state_records(panel, df, value_column, decimals=VALUE_DECIMALS):
+    """
+    Aggregates a per-county result to one record per state, for a
+    low-detail view of the whole country.
+
+    The state circle sits at the mean of its counties' positions and is
+    sized by the mean of their values.
+
+    Parameters:
+        panel - ValuePanel the result was computed from
+        df - DataFrame with region_id and `value_column`
+        value_column - column drawn as the circle radius
+        decimals - decimals kept for the value
+
+    Returns:
+        list of dicts with name, position, value and counties
+    """
+    rows = pd.Index(panel.regions['region_id']).get_indexer(df['region_id'])
+    regions = panel.regions.iloc[rows]
+    counties = pd.DataFrame({
+        'state': regions['state'].to_numpy(),
+        'longitude': regions['longitude'].to_numpy(dtype=np.float64),
+        'latitude': regions['latitude'].to_numpy(dtype=np.float64),
+        'value': df[value_column].to_numpy(dtype=np.float64),
+    })
+    counties = counties[(rows >= 0) & counties.notna().all(axis=1).values]
+
+    states = counties.groupby('state').agg(
+        longitude=('longitude', 'mean'),
+        latitude=('latitude', 'mean'),
+        value=('value', 'mean'),
+        counties=('value', 'size'))
+    records = _records(states.index.to_numpy(), states['longitude'].to_numpy(),
+                       states['latitude'].to_numpy(), states['value'].to_numpy(), decimals)
+    for record, count in zip(records, states['counties'].tolist()):
+        record['counties'] = count
+    return records
+
+
+def _records(names, longitude, latitude, values, decimals):
+    longitude = np.round(longitude, POSITION_DECIMALS).tolist()
+    latitude = np.round(latitude, POSITION_DECIMALS).tolist()
+    values = np.round(values, decimals).tolist()
+    return [{'name': name, 'position': [x, y], 'value': value}
+            for name, x, y, value in zip(names.tolist(), longitude, latitude, values)]
+
+
+@lru_cache(maxsize=64)
+def mean_value_map(panel, start_date, end_date):
+    """
+    Mean home value per county between two dates, with its map payloads.
+
+    Cached per panel and date range, so moving the year sliders back to a
+    range seen before reuses the table and both payloads.  The cached
+    objects are shared and must not be modified.
+
+    Parameters:
+        panel - ValuePanel
+        start_date - string or datetime of the first year
+        end_date - string or datetime of the end year (exclusive)
+
+    Returns:
+        dict with 'table' (DataFrame, value in thousands of dollars),
+        'county' and 'state' (lists of layer records)
+    """
+    table = res.get_county_df_with_mean(panel, start_date, end_date)
+
+    # Divide price by 1000 so that it looks better on map.
+    table['value'] = table['value'] / 1000
+
+    return {
+        'table': table,
+        'county': county_records(panel, table, 'value'),
+        'state': state_records(panel, table, 'value'),
+    }
+
+
+@lru_cache(maxsize=64)
+def pct_change_map(panel, start_date, end_date):
+    """
+    Cumulative percent change per county between two dates, with its map payloads.
+
+    Parameters:
+        panel - ValuePanel
+        start_date - string or datetime of the first year
+        end_date - string or datetime of the end year (exclusive)
+
+    Returns:
+        dict with 'table' (DataFrame with coordinates and cum_pct_ch),
+        'county' and 'state' (lists of layer records)
+    """
+    pct_change_df = res.get_county_df_with_cum_pct_change(panel, start_date, end_date)
+
+    # Attach coordinates by the integer region_id; the panel already carries
+    # each region's crosswalked FIPS coordinates
+    table = pd.merge(
+        pct_change_df, panel.regions[['region_id', 'latitude', 'longitude']], on='region_id')
+    table = table[['region_id', 'county', 'state', 'latitude', 'longitude', 'cum_pct_ch']]
+
+    return {
+        'table': table,
+        'county': county_records(panel, table, 'cum_pct_ch'),
+        'state': state_records(panel, table, 'cum_pct_ch'),
+    }
+
+
+# Per-county return metrics that can be drawn on the percent change map:
+# label -> (column of get_county_return_metrics, radius scale of the circles)
+RETURN_METRIC_LAYERS = {
+    'Compounded return': ('total_return', 200),
+    'CAGR': ('cagr', 2000),
+    'Volatility': ('volatility', 3000),
+    'Max drawdown': ('max_drawdown', 500),
+}
+
+
+@lru_cache(maxsize=64)
+def return_metric_map(panel, start_date, end_date, metric):
+    """
+    One return metric per county between two dates, with its map payloads.
+
+    The metrics of every county are computed once per window (see
+    realestate_stats.return_metrics); this adds the payloads per metric.
+
+    Parameters:
+        panel - ValuePanel
+        start_date - string or datetime of the first year
+        end_date - string or datetime of the end year (exclusive)
+        metric - column of realestate_stats.get_county_return_metrics
+
+    Returns:
+        dict with 'table' (DataFrame with coordinates and every metric),
+        'county' and 'state' (lists of layer records for `metric`)
+    """
+    metrics_df = res.get_county_return_metrics(panel, start_date, end_date)
+    table = pd.merge(
+        metrics_df, panel.regions[['region_id', 'latitude', 'longitude']], on='region_id')
+
+    return {
+        'table': table,
+        'county': county_records(panel, table, metric),
+        'state': state_records(panel, table, metric),
+    }
+
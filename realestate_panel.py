@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+
+
+# Which ends of a date range are included, as in pandas' Series.between
+INCLUSIVE_OPTIONS = ('both', 'neither', 'left', 'right')
+
+
+def month_bounds(start_date, end_date, inclusive='both'):
+    """
+    Converts a date range to the first and last month it covers.
+
+    Dates are compared by month: any date in the start or end month counts
+    as that month, so '2010-01-01' and '2010-01-31' select the same months.
+
+    Parameters:
+        start_date - string or datetime in the first month of the range
+        end_date - string or datetime in the last month of the range
+        inclusive - 'both', 'neither', 'left' or 'right': which of the start
+            and end months are part of the range
+
+    Returns:
+        tuple of (first month, last month) as numpy datetime64[M], both included
+    """
+    if inclusive not in INCLUSIVE_OPTIONS:
+        raise ValueError(f"inclusive must be one of {INCLUSIVE_OPTIONS}, got {inclusive!r}")
+    first = np.datetime64(pd.Timestamp(start_date), 'M')
+    last = np.datetime64(pd.Timestamp(end_date), 'M')
+    if inclusive in ('neither', 'right'):
+        first += 1
+    if inclusive in ('neither', 'left'):
+        last -= 1
+    return first, last
+
+
+# Per-region columns kept in ValuePanel.regions, when present
+REGION_ATTRIBUTES = ['region_id', 'fips', 'county', 'state', 'latitude', 'longitude']
+
+
+def month_end_dates(months):
+    """
+    Converts month numbers (months since 1970-01) to month-end dates.
+
+    Parameters:
+        months - integer array of month numbers
+
+    Returns:
+        DatetimeIndex of the last day of each month
+    """
+    month_starts = np.asarray(months, dtype=np.int64).astype('datetime64[M]')
+    return pd.DatetimeIndex((month_starts + 1).astype('datetime64[D]') - 1)
+
+
+def _labelled(regions):
+    """
+    Copies a region table with county and state as strings and the
+    "county, state" label, which is how the MACD and Monte Carlo sections
+    name a county.
+    """
+    regions = regions.reset_index(drop=True)
+    for column in ['county', 'state']:
+        regions[column] = regions[column].astype(str)
+    regions['label'] = regions['county'] + ", " + regions['state']
+    return regions
+
+
+class ValuePanel:
+    """
+    Dense (n_regions, n_months) float32 matrix of Zillow home values.
+
+    Rows are regions sorted by region_id and columns are the sorted dates found
+    in the data; months without a value are NaN.  Each region's history is a
+    contiguous row, so per-county analytics read a slice instead of filtering
+    the long-format master DataFrame.
+
+    Attributes:
+        values - float32 ndarray of shape (n_regions, n_months)
+        dates - DatetimeIndex of the columns
+        regions - DataFrame with one row per region (region_id, fips, county,
+            state, latitude, longitude, label) in row order
+    """
+
+    def __init__(self, values, dates, regions):
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        self.dates = pd.DatetimeIndex(dates)
+        self.regions = regions.reset_index(drop=True)
+        self._months = self.dates.values.astype('datetime64[M]')
+        self._region_index = pd.Index(self.regions['region_id'])
+        self._label_index = pd.Index(self.regions['label'])
+
+    @classmethod
+    def from_frame(cls, master_df):
+        """
+        Builds the panel from a long-format master DataFrame.
+
+        Parameters:
+            master_df - DataFrame with region_id, county, state, date and value,
+                plus latitude and longitude when available
+
+        Returns:
+            ValuePanel
+        """
+        attribute_columns = [c for c in REGION_ATTRIBUTES if c in master_df.columns]
+        regions = master_df[attribute_columns].drop_duplicates('region_id')
+        regions = _labelled(regions.sort_values('region_id'))
+
+        dates = pd.DatetimeIndex(np.unique(master_df['date'].values))
+
+        rows = pd.Index(regions['region_id']).get_indexer(master_df['region_id'])
+        columns = dates.get_indexer(master_df['date'])
+        values = np.full((len(regions), len(dates)), np.nan, dtype=np.float32)
+        values[rows, columns] = master_df['value'].values
+
+        return cls(values, dates, regions)
+
+    @classmethod
+    def from_tables(cls, regions, facts):
+        """
+        Builds the panel from the normalized master tables.
+
+        Parameters:
+            regions - dimension table with one row per region_code, sorted by
+                region_id (see realestate_data.split_master_df)
+            facts - fact table with region_code, month and value
+
+        Returns:
+            ValuePanel
+        """
+        months = np.unique(facts['month'].values)
+        columns = months.searchsorted(facts['month'].values)
+        values = np.full((len(regions), len(months)), np.nan, dtype=np.float32)
+        values[facts['region_code'].values, columns] = facts['value'].values
+
+        attribute_columns = [c for c in REGION_ATTRIBUTES if c in regions.columns]
+        return cls(values, month_end_dates(months), _labelled(regions[attribute_columns]))
+
+    def __len__(self):
+        return len(self.regions)
+
+    def region_position(self, region_id):
+        """
+        Returns the row of a region_id.
+        """
+        return self._region_index.get_loc(region_id)
+
+    def label_position(self, label):
+        """
+        Returns the row of a "county, state" label.
+        """
+        return self._label_index.get_loc(label)
+
+    def position(self, county):
+        """
+        Returns the row of a county given by region_id or "county, state" label.
+        """
+        if isinstance(county, str):
+            return self.label_position(county)
+        return self.region_position(county)
+
+    def label(self, county):
+        """
+        Returns the "county, state" label of a county given by region_id or label.
+        """
+        return self.regions['label'].iat[self.position(county)]
+
+    def date_slice(self, start=None, end=None):
+        """
+        Returns the column slice for dates in [start, end).
+
+        Parameters:
+            start - first date to include, or None for the first month
+            end - first date to exclude, or None for past the last month
+
+        Returns:
+            slice over the panel columns
+        """
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='left')
+        return slice(first, max(first, last))
+
+    def month_slice(self, start_date, end_date, inclusive='both'):
+        """
+        Returns the column slice for the months in a date range, found by
+        binary search on the sorted month of each column.
+
+        Parameters:
+            start_date - date in the first month of the range
+            end_date - date in the last month of the range
+            inclusive - which ends of the range are included (see month_bounds)
+
+        Returns:
+            slice over the panel columns
+        """
+        first, last = month_bounds(start_date, end_date, inclusive)
+        start = self._months.searchsorted(first, side='left')
+        stop = self._months.searchsorted(last, side='right')
+        return slice(start, max(start, stop))
+
+    def region_frame(self, county, start=None, end=None):
+        """
+        Returns the observed values of one county between two dates.
+
+        Parameters:
+            county - region_id or "county, state" label of the county
+            start - first date to include, or None
+            end - first date to exclude, or None
+
+        Returns:
+            DataFrame with date and value columns for the months with data
+        """
+        columns = self.date_slice(start, end)
+        row = self.values[self.position(county), columns]
+        observed = ~np.isnan(row)
+        return pd.DataFrame({'date': self.dates[columns][observed], 'value': row[observed]})
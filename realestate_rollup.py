@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+from realestate_instrument import instrumented
+
+
+# Aggregation levels of the cube, from coarsest to finest
+LEVELS = ('nation', 'state', 'county')
+
+
+class RollupCube:
+    """
+    Sum, count and mean of home values per (level, key, month) at nation,
+    state and county level.
+
+    The nation and state rollups are built once from a ValuePanel with one
+    pass over its values and extended month by month when new data arrives,
+    so the nationwide and state series are lookups instead of groupbys over
+    the long data.  The county level is the panel itself: each county row
+    already is that county's sum over one region.
+
+    Attributes:
+        panel - ValuePanel the cube was built from
+        dates - DatetimeIndex of the months
+        states - Index of the state keys
+        sums - dict of level -> float64 array (n_keys, n_months) of value sums
+        counts - dict of level -> int32 array (n_keys, n_months) of counties
+            reporting
+    """
+
+    def __init__(self, panel, states, sums, counts):
+        self.panel = panel
+        self.dates = panel.dates
+        self.states = states
+        self.sums = sums
+        self.counts = counts
+        self._state_codes = states.get_indexer(panel.regions['state'])
+
+    @classmethod
+    def from_panel(cls, panel):
+        """
+        Builds the nation and state rollups of a panel.
+
+        Parameters:
+            panel - ValuePanel
+
+        Returns:
+            RollupCube
+        """
+        states = pd.Index(np.unique(panel.regions['state'].values))
+        sums, counts = _rollup(panel.values, states.get_indexer(panel.regions['state']), len(states))
+        return cls(panel, states, sums, counts)
+
+    @instrumented
+    def extend(self, panel):
+        """
+        Returns the cube for a newer panel, aggregating only the months that
+        are new or changed.
+
+        sync_zillow_sales fetches rows after each region's own latest month, so
+        a region that was behind gets values in months the cube already holds.
+        Existing months whose panel column differs from this cube's panel are
+        therefore aggregated again along with the new months.  When the regions
+        differ (e.g. a county was added) the cube is rebuilt instead.
+
+        Parameters:
+            panel - ValuePanel with the same regions and at least the same months
+
+        Returns:
+            RollupCube
+        """
+        same_regions = (len(panel.regions) == len(self.panel.regions) and
+                        np.array_equal(panel.regions['region_id'].values,
+                                       self.panel.regions['region_id'].values))
+        if not same_regions or not self.dates.isin(panel.dates).all():
+            return RollupCube.from_panel(panel)
+
+        # Existing months keep their position among the panel's sorted months
+        positions = panel.dates.get_indexer(self.dates)
+        old_values = self.panel.values
+        new_values = panel.values[:, positions]
+        unchanged = ((new_values == old_values) | (np.isnan(new_values) & np.isnan(old_values))).all(axis=0)
+        stale = ~panel.dates.isin(self.dates)
+        stale[positions[~unchanged]] = True
+        if not stale.any():
+            return RollupCube(panel, self.states, self.sums, self.counts)
+
+        new_sums, new_counts = _rollup(panel.values[:, stale], self._state_codes, len(self.states))
+        sums, counts = {}, {}
+        for level in self.sums:
+            sums[level] = np.empty((len(self.sums[level]), len(panel.dates)))
+            sums[level][:, positions] = self.sums[level]
+            sums[level][:, stale] = new_sums[level]
+            counts[level] = np.empty((len(self.counts[level]), len(panel.dates)), dtype=np.int32)
+            counts[level][:, positions] = self.counts[level]
+            counts[level][:, stale] = new_counts[level]
+        return RollupCube(panel, self.states, sums, counts)
+
+    def keys(self, level):
+        """
+        Returns the keys of a level: [None] for the nation, state codes, or
+        county "county, state" labels.
+        """
+        if level == 'nation':
+            return [None]
+        if level == 'state':
+            return list(self.states)
+        if level == 'county':
+            return list(self.panel.regions['label'])
+        raise ValueError(f"level must be one of {LEVELS}, got {level!r}")
+
+    def frame(self, level='nation', key=None, count=False):
+        """
+        Returns the monthly series of one key of a level, shaped like the
+        nationwide DataFrame the MACD section uses.
+
+        Parameters:
+            level - 'nation', 'state' or 'county'
+            key - state code for the state level, region_id or "county, state"
+                label for the county level, ignored for the nation
+            count - also return the number of counties reporting
+
+        Returns:
+            DataFrame indexed by date with value (sum), avg (mean per
+            reporting county) and optionally count; months without data
+            are left out
+        """
+        sums, counts = self._series(level, key)
+        reporting = counts > 0
+        frame = pd.DataFrame({'value': sums[reporting]}, index=self.dates[reporting].rename('date'))
+        # Must divide 'values' by number of counties that make up said value so data isn't skewed by county number
+        frame['avg'] = frame['value'] / counts[reporting]
+        if count:
+            frame['count'] = counts[reporting]
+        return frame
+
+    def mean(self, level, columns):
+        """
+        Mean value per key of a level over a window of months, weighting
+        every reported county-month equally.
+
+        Parameters:
+            level - 'nation', 'state' or 'county'
+            columns - slice of months, e.g. from ValuePanel.month_slice
+
+        Returns:
+            DataFrame indexed by key with value (mean) and count (county-months)
+        """
+        if level == 'county':
+            values = self.panel.values[:, columns].astype(np.float64)
+            counts = (~np.isnan(values)).sum(axis=1)
+            sums = np.nansum(values, axis=1)
+        else:
+            if level not in self.sums:
+                raise ValueError(f"level must be one of {LEVELS}, got {level!r}")
+            sums = self.sums[level][:, columns].sum(axis=1)
+            counts = self.counts[level][:, columns].sum(axis=1)
+        means = np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+        return pd.DataFrame({'value': means, 'count': counts},
+                            index=pd.Index(self.keys(level), name=level))
+
+    def _series(self, level, key):
+        if level == 'nation':
+            return self.sums['nation'][0], self.counts['nation'][0]
+        if level == 'state':
+            row = self.states.get_loc(key)
+            return self.sums['state'][row], self.counts['state'][row]
+        if level == 'county':
+            values = self.panel.values[self.panel.position(key)].astype(np.float64)
+            observed = ~np.isnan(values)
+            return np.where(observed, values, 0.0), observed.astype(np.int32)
+        raise ValueError(f"level must be one of {LEVELS}, got {level!r}")
+
+
+def _rollup(values, state_codes, n_states):
+    """
+    Sums and counts the columns of a panel block per state and for the nation.
+    """
+    observed = ~np.isnan(values)
+    filled = np.where(observed, values, 0).astype(np.float64)
+
+    # Sort the rows by state once; every state is then one reduceat segment
+    order = np.argsort(state_codes, kind='stable')
+    codes = state_codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+    state_sums = np.zeros((n_states, values.shape[1]))
+    state_counts = np.zeros((n_states, values.shape[1]), dtype=np.int32)
+    if len(codes):
+        state_sums[codes[starts]] = np.add.reduceat(filled[order], starts, axis=0)
+        state_counts[codes[starts]] = np.add.reduceat(observed[order].astype(np.int32), starts, axis=0)
+
+    sums = {'nation': state_sums.sum(axis=0, keepdims=True), 'state': state_sums}
+    counts = {'nation': state_counts.sum(axis=0, keepdims=True, dtype=np.int32), 'state': state_counts}
+    return sums, counts
@@ -1,56 +1,321 @@
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
+from realestate_panel import ValuePanel, month_bounds
+from realestate_instrument import instrumented
+
+
+# Columns of get_county_return_metrics after state, county and region_id
+RETURN_METRICS = ['months', 'start_value', 'end_value', 'total_return', 'cagr', 'volatility',
+                  'max_drawdown', 'best_month', 'worst_month']
 
 
-def get_county_df_with_mean(df, start_date, end_date):
+@instrumented
+def get_county_df_with_mean(df, start_date, end_date, inclusive=None):
     """
     Return a DataFrame that provides the mean value for a date range grouped by counties and states
 
     Parameters: 
-        df - DataFrame to calculate mean value for
+        df - DataFrame or ValuePanel to calculate mean value for
         start_date - filter data after this date
         end_date - filter data before this date
+        inclusive - None to keep only the years strictly between the start
+            and end years, or 'both', 'neither', 'left' or 'right' to select
+            months from the start month to the end month, with the given
+            ends included
 
     Returns: 
         DataFrame with mean value grouped by counties and states
 
     """
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+    first, last = _query_months(start_date, end_date, inclusive)
 
-    cur_df = df
-    cur_df = cur_df[cur_df['date'].dt.year > start_date.year]
-    cur_df = cur_df[cur_df['date'].dt.year < end_date.year]
+    if isinstance(df, ValuePanel):
+        return prefix_sum_index(df).mean(df.month_slice(first, last))
 
-    mean_df = cur_df.groupby(
-        ["state", "county", "region_id"], as_index=False).mean()
-    return mean_df
+    cur_df = df[_month_mask(df, first, last)]
 
+    # Group on the integer region_id and attach the names afterwards
+    value_columns = [c for c in ['value', 'latitude', 'longitude'] if c in cur_df.columns]
+    mean_df = cur_df.groupby('region_id')[value_columns].mean()
+    return _with_region_names(mean_df, cur_df)
 
-def get_county_df_with_cum_pct_change(df, start_date, end_date):
+
+@instrumented
+def get_county_df_with_cum_pct_change(df, start_date, end_date, inclusive=None):
     """
     Return a DataFrame that provides the cumulative percentage change for a 
     date range grouped by counties and states
 
     Parameters: 
-        df - DataFrame to calculate mean value for
+        df - DataFrame or ValuePanel to calculate mean value for
         start_date - filter data after this date
         end_date - filter data before this date
+        inclusive - None to keep only the years strictly between the start
+            and end years, or 'both', 'neither', 'left' or 'right' to select
+            months from the start month to the end month, with the given
+            ends included
 
     Returns: 
         DataFrame with cumulative percentage change
 
     """
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+    first, last = _query_months(start_date, end_date, inclusive)
+
+    if isinstance(df, ValuePanel):
+        return prefix_sum_index(df).cum_pct_change(df.month_slice(first, last))
+
+    cur_df = df[_month_mask(df, first, last)]
+
+    # Group on the integer region_id and attach the names afterwards
+    pct_change = cur_df.groupby('region_id')["value"].pct_change()
+
+    yearly_df = pct_change.groupby(cur_df['region_id']).sum(
+    ).mul(100).to_frame('cum_pct_ch')
+
+    return _with_region_names(yearly_df, cur_df)
+
+
+@instrumented
+def get_county_return_metrics(df, start_date, end_date, inclusive=None):
+    """
+    Return a DataFrame with compounded return, CAGR, volatility, max drawdown
+    and other summary metrics for a date range, per county and state
+
+    Unlike get_county_df_with_cum_pct_change, which sums the monthly pct
+    changes, total_return compounds them: it is the last value over the
+    first value in the window.
+
+    Parameters: 
+        df - DataFrame or ValuePanel to calculate the metrics for
+        start_date - filter data after this date
+        end_date - filter data before this date
+        inclusive - None for the years strictly between the start and end
+            years, or which ends of a month range are included (see
+            get_county_df_with_mean)
+
+    Returns: 
+        DataFrame with state, county, region_id, months, start_value,
+        end_value and total_return, cagr, volatility, max_drawdown,
+        best_month and worst_month in percent
+
+    """
+    first, last = _query_months(start_date, end_date, inclusive)
+
+    if isinstance(df, ValuePanel):
+        columns = df.month_slice(first, last)
+        return return_metrics(df, columns.start, columns.stop)
+
+    panel = ValuePanel.from_frame(df[_month_mask(df, first, last)])
+    return _return_metrics(panel, slice(0, len(panel.dates)))
+
+
+@lru_cache(maxsize=32)
+def return_metrics(panel, start, stop):
+    """
+    Returns the return metrics of a panel over columns [start, stop), cached
+    per panel and window.  The cached DataFrame is shared and must not be
+    modified.
+    """
+    return _return_metrics(panel, slice(start, stop))
+
+
+def _return_metrics(panel, columns):
+    """
+    Computes the return metrics of every county in one vectorized pass over
+    a window of panel columns.
+
+    Months without a value are skipped: the return of an observed month is
+    measured from the previous observed value, and drawdowns are measured on
+    the forward-filled values.
+    """
+    values = panel.values[:, columns].astype(np.float64)
+    observed = ~np.isnan(values)
+    has_data = observed.any(axis=1)
+    order = panel.regions.sort_values(['state', 'county', 'region_id']).index.values
+    kept = order[has_data[order]]
+    result = panel.regions.loc[kept, ['state', 'county', 'region_id']].reset_index(drop=True)
+    if len(kept) == 0:
+        for name in RETURN_METRICS:
+            result[name] = pd.Series(dtype=np.float64)
+        return result
+
+    values, observed = values[kept], observed[kept]
+    rows = np.arange(len(kept))[:, None]
+    months = np.arange(values.shape[1])
+
+    # Forward-fill through missing months; every kept row has a value
+    last_seen = np.maximum.accumulate(np.where(observed, months, -1), axis=1)
+    filled = np.where(last_seen >= 0, values[rows, np.maximum(last_seen, 0)], np.nan)
+    first_idx = np.argmax(observed, axis=1)
+    last_idx = last_seen[:, -1]
+    start_value = values[rows[:, 0], first_idx]
+    end_value = values[rows[:, 0], last_idx]
+    total_return = end_value / start_value - 1
+
+    # Compound annual growth over the calendar months between the first and last value
+    dates = panel.dates[columns]
+    calendar_month = dates.year.values * 12 + dates.month.values
+    elapsed = calendar_month[last_idx] - calendar_month[first_idx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = np.where(elapsed > 0, (1 + total_return) ** (12 / np.maximum(elapsed, 1)) - 1, np.nan)
 
-    cur_df = df
-    cur_df = cur_df[cur_df['date'].dt.year > start_date.year]
-    cur_df = cur_df[cur_df['date'].dt.year < end_date.year]
+        # Monthly returns of observed months against the previous observed value
+        returns = values[:, 1:] / filled[:, :-1] - 1
+    has_return = observed[:, 1:] & ~np.isnan(filled[:, :-1])
+    count = has_return.sum(axis=1)
+    returns = np.where(has_return, returns, 0.0)
+    mean = returns.sum(axis=1) / np.maximum(count, 1)
+    squares = np.where(has_return, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1)
+    volatility = np.where(count > 1, np.sqrt(squares / np.maximum(count - 1, 1) * 12), np.nan)
+    best_month = np.where(count > 0, np.where(has_return, returns, -np.inf).max(axis=1, initial=-np.inf), np.nan)
+    worst_month = np.where(count > 0, np.where(has_return, returns, np.inf).min(axis=1, initial=np.inf), np.nan)
 
-    cur_df["pct_change"] = cur_df.groupby(["state", "county", "region_id"])[
-        "value"].pct_change()
+    # Largest fall from a running peak
+    running_peak = np.fmax.accumulate(filled, axis=1)
+    with np.errstate(invalid='ignore'):
+        drawdown = np.where(np.isnan(filled), 0.0, filled / running_peak - 1)
+    max_drawdown = drawdown.min(axis=1)
 
-    yearly_df = cur_df.groupby(["state", "county", "region_id"])["pct_change"].sum(
-    ).mul(100).reset_index().rename(columns={'pct_change': 'cum_pct_ch'})
+    result['months'] = observed.sum(axis=1)
+    result['start_value'] = start_value
+    result['end_value'] = end_value
+    for name, metric in [('total_return', total_return), ('cagr', cagr), ('volatility', volatility),
+                         ('max_drawdown', max_drawdown), ('best_month', best_month),
+                         ('worst_month', worst_month)]:
+        result[name] = metric * 100
+    return result
 
-    return yearly_df
+
+def _query_months(start_date, end_date, inclusive):
+    """
+    First and last month (datetime64[M], both included) selected by a query.
+
+    With inclusive=None the original year filter applies: only the years
+    strictly after the start year and before the end year.
+    """
+    if inclusive is None:
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+        return (np.datetime64(f'{start_date.year + 1}-01', 'M'),
+                np.datetime64(f'{end_date.year - 1}-12', 'M'))
+    return month_bounds(start_date, end_date, inclusive)
+
+
+def _month_mask(df, first, last):
+    """
+    Boolean mask of the rows of a long DataFrame dated from month `first`
+    to month `last`, computed from one conversion of the date column.
+    """
+    months = df['date'].values.astype('datetime64[M]')
+    return (months >= first) & (months <= last)
+
+
+def _with_region_names(region_df, df):
+    """
+    Adds state and county to a DataFrame indexed by region_id and sorts it
+    like a groupby on state, county and region_id.
+    """
+    names = df.drop_duplicates('region_id').set_index('region_id')[['state', 'county']]
+    result = names.join(region_df, how='inner').reset_index()
+    result = result[['state', 'county', 'region_id'] + list(region_df.columns)]
+    return result.sort_values(['state', 'county', 'region_id']).reset_index(drop=True)
+
+
+class PrefixSumIndex:
+    """
+    Per-county prefix sums over the months of a ValuePanel.
+
+    Any [start, end) column range query for every county is then a couple of
+    vector subtractions instead of a filter and groupby over the long data.
+
+    Attributes:
+        value_sums - running sum of values before each month, (n_regions, n_months + 1)
+        counts - running number of months with a value before each month
+        pct_change_sums - running sum of monthly pct changes before each month,
+            with missing months forward filled
+        next_observed - first month with a value at or after each month
+            (n_months when there is none), (n_regions, n_months + 1)
+        order - panel rows sorted by state, county and region_id
+    """
+
+    def __init__(self, panel):
+        values = panel.values.astype(np.float64)
+        observed = ~np.isnan(values)
+        n_regions, n_months = values.shape
+
+        self.panel = panel
+        self.value_sums = np.zeros((n_regions, n_months + 1))
+        np.cumsum(np.where(observed, values, 0), axis=1, out=self.value_sums[:, 1:])
+        self.counts = np.zeros((n_regions, n_months + 1), dtype=np.int32)
+        np.cumsum(observed, axis=1, out=self.counts[:, 1:])
+
+        # Monthly pct change between consecutive observed values, 0 elsewhere
+        filled = pd.DataFrame(values.T).ffill().values.T
+        pct_change = np.zeros_like(values)
+        pct_change[:, 1:] = filled[:, 1:] / filled[:, :-1] - 1
+        np.nan_to_num(pct_change, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        self.pct_change_sums = np.zeros((n_regions, n_months + 1))
+        np.cumsum(pct_change, axis=1, out=self.pct_change_sums[:, 1:])
+
+        # Scan right to left for the next month with a value
+        months = np.where(observed, np.arange(n_months), n_months)
+        self.next_observed = np.full((n_regions, n_months + 1), n_months, dtype=np.int32)
+        self.next_observed[:, :-1] = np.minimum.accumulate(months[:, ::-1], axis=1)[:, ::-1]
+
+        self.order = panel.regions.sort_values(['state', 'county', 'region_id']).index.values
+
+    def mean(self, columns):
+        """
+        Mean value per county over a slice of panel columns.
+
+        Returns:
+            DataFrame like get_county_df_with_mean
+        """
+        counts = self.counts[:, columns.stop] - self.counts[:, columns.start]
+        sums = self.value_sums[:, columns.stop] - self.value_sums[:, columns.start]
+        means = np.divide(sums, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+        result = {'value': means.astype(self.panel.values.dtype)}
+        for column in ['latitude', 'longitude']:
+            if column in self.panel.regions:
+                result[column] = self.panel.regions[column].values
+        return self._result(counts > 0, result)
+
+    def cum_pct_change(self, columns):
+        """
+        Sum of monthly pct changes per county over a slice of panel columns.
+
+        The first month with a value in the window has no pct change, so the
+        sum runs from the month after it to the end of the window.
+
+        Returns:
+            DataFrame like get_county_df_with_cum_pct_change
+        """
+        first = self.next_observed[:, columns.start]
+        has_data = first < columns.stop
+        after_first = np.minimum(first + 1, columns.stop)
+        rows = np.arange(len(first))
+        cum_pct_ch = (self.pct_change_sums[:, columns.stop] - self.pct_change_sums[rows, after_first]) * 100
+        return self._result(has_data, {'cum_pct_ch': cum_pct_ch})
+
+    def _result(self, mask, columns):
+        """
+        Builds a result DataFrame for the masked counties, sorted like a
+        groupby on state, county and region_id.
+        """
+        rows = self.order[mask[self.order]]
+        result = self.panel.regions.loc[rows, ['state', 'county', 'region_id']].reset_index(drop=True)
+        for name, values in columns.items():
+            result[name] = values[rows]
+        return result
+
+
+@instrumented
+@lru_cache(maxsize=4)
+def prefix_sum_index(panel):
+    """
+    Returns the PrefixSumIndex of a panel, building it on first use.
+    """
+    return PrefixSumIndex(panel)
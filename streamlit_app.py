@@ -1,66 +1,28 @@
 # Import the required libraries
-import os
+# The plotting libraries (pydeck, holoviews/hvplot, matplotlib) are slow to
+# import, so each section imports the ones it draws with.  The first sections
+# render while the later ones are still loading theirs.
+import time
 import streamlit as st
-import pandas as pd
-import pydeck as pdk
-import holoviews as hv
-import hvplot.pandas
-from pathlib import Path
-import requests
-import nasdaqdatalink
-import shutil
-import pandas_ta as ta
-from MCForecastTools import MCSimulation
-from datetime import datetime
-import realestate_data as red
-import realestate_stats as res
+import realestate_access as rea
+import realestate_instrument as ins
+import realestate_jobs as rjobs
+import realestate_map as rmap
 import macd
 
-import matplotlib.pyplot as plt
-import numpy as np
-import pytz
-
 # Using streamlit secrets to link API key from .toml file
 NASDAQ_DATA_LINK_API_KEY = st.secrets['NASDAQ_DATA_LINK_API_KEY']
 
 # setting layout of streamlit application to "wide" formatte
 st.set_page_config(layout="wide")
 
-# Defining Global variables
-region_df = pd.DataFrame()
-zillow_df = pd.DataFrame()
-county_coordinates_df = pd.DataFrame()
-master_df = pd.DataFrame()
-
-
-# Loading data from realestate_data.py
-region_df = red.load_zillow_region_data()
-zillow_df = red.load_zillow_sales_data(region_df)
-county_coordinates_df = red.load_county_coordinates()
-
-
-
-# Clean and Merge Data
-
-# Merge the Region dataframe with the Zillow sales data
-zillow_merge_df = pd.merge(region_df, zillow_df, on=['region_id'])
-
-# Rename county_x and state_x so that we can return a clean dataframe
-zillow_merge_df.rename(
-    columns={'county_x': 'county', 'state_x': 'state'}, inplace=True)
+# Data is loaded lazily by each section through realestate_access, which
+# memoizes the loads and derived frames for the whole process, so a rerun
+# only pays for what its sections compute.
+rea.start_rerun()
 
-# Drop unnecessary columns
-zillow_merge_df = zillow_merge_df[[
-    'region_id', 'county', 'state', 'date', 'value']]
-
-# Check the merged Zillow data
-zillow_merge_df.head()
-
-# Merge the Zillow data and county coordinates data.
-master_df = pd.merge(zillow_merge_df, county_coordinates_df,
-                     on=['county', 'state'])
-
-master_df['date'] = pd.to_datetime(master_df['date'])
+# Per-section timings, recorded only when REALESTATE_PROFILE is set
+ins.start_rerun()
 
 # Set up containers for streamlit application
 header = st.container()
@@ -70,13 +32,16 @@ macd_container = st.container()
 montecarlo = st.container()
 
 # Format header container
-with header:
+with header, ins.timed('Header'):
     # Titling our stremlit application
     st.title('Realestate of Mind')
 
 # Format ave_home_sales container
-with avg_home_sales:
+with avg_home_sales, ins.timed('Average Home Sales'):
     
+    # For the map
+    import pydeck as pdk
+
     # Adding subheader to ave_home_sales container
     st.subheader("Average Home Sales")
 
@@ -84,32 +49,32 @@ with avg_home_sales:
     min_year = st.slider('Starting Year', 1997, 2022, 1997)
     max_year = st.slider('Ending Year', 1997, 2022, 2022)
 
-    # Display average home sales per county
-    county_mean_df = res.get_county_df_with_mean(
-        master_df, str(min_year) + '-01-01', str(max_year) + '-01-01')
+    # Choose between one circle per county and one per state
+    mean_level = st.radio('Map detail', ['County', 'State'], horizontal=True, key='mean_level')
 
-    # Divide price by 1000 so that it looks better on map.
-    county_mean_df["value"] = county_mean_df["value"] / 1000
+    # Mean sales per county and its compact map payload, cached per year range
+    mean_map = rmap.mean_value_map(
+        rea.panel(), str(min_year) + '-01-01', str(max_year) + '-01-01')
+    county_mean_df = mean_map['table']
 
     # Tooltip to display county data
     tooltip = {
-        "html": "County: {county}</br> State: {state}</br>  Mean Sales: ${value}</br> " +
-        "Latitude: {latitude} </br> Longitude: {longitude} </br> "
+        "html": "{name}</br> Mean Sales: ${value}k</br> "
     }
 
     # Define a layer to display on a map
     layer = pdk.Layer(
         "ScatterplotLayer",
-        county_mean_df,
+        mean_map[mean_level.lower()],
         pickable=True,
         opacity=0.8,
         stroked=True,
         filled=True,
-        radius_scale=20,
+        radius_scale=20 if mean_level == 'County' else 100,
         radius_min_pixels=1,
         radius_max_pixels=100,
         line_width_min_pixels=1,
-        get_position='[longitude, latitude]',
+        get_position='position',
         get_radius="value",
         get_fill_color=[255, 140, 0],
         get_line_color=[0, 0, 0],
@@ -135,48 +100,55 @@ with avg_home_sales:
     col1, col2 = st.columns((3, 1))
     
     # Rendering map to column1
-    col1.write(r)
+    with ins.timed('pydeck render'):
+        col1.write(r)
     
     # Displaying dataframe to column 2
     col2.dataframe(county_mean_df, 700, 700)
 
 # Format pct_change_sales container
-with pct_change_sales:
+with pct_change_sales, ins.timed('Percent Change in Home Sales'):
+    import pydeck as pdk
+
     # Adding subheader
     st.subheader("Percent Change in Home Sales")
 
-    # Display percent change per county
-    county_pct_change_df = res.get_county_df_with_cum_pct_change(
-        master_df, '2010-01-01', '2022-08-01')
-
-    # Merge county_pct_change_df and county_coordinates_df into one dataframe by county and state values
-    merge_county_pct_change_df = pd.merge(
-        county_pct_change_df, county_coordinates_df, on=['county', 'state'])
-
-    # Drop unnecessary columns
-    merge_county_pct_change_df = merge_county_pct_change_df[[
-        'region_id', 'county', 'state', 'latitude', 'longitude', 'cum_pct_ch']]
+    # Choose the statistic shown and between one circle per county and one per state
+    col1, col2 = st.columns(2)
+    pct_metric = col1.selectbox(
+        'Statistic', ['Pct change (sum of monthly changes)'] + list(rmap.RETURN_METRIC_LAYERS))
+    pct_level = col2.radio('Map detail', ['County', 'State'], horizontal=True, key='pct_level')
+
+    # Percent change or return metric per county and its compact map payload
+    if pct_metric in rmap.RETURN_METRIC_LAYERS:
+        metric_column, pct_radius_scale = rmap.RETURN_METRIC_LAYERS[pct_metric]
+        pct_change_map = rmap.return_metric_map(
+            rea.panel(), '2010-01-01', '2022-08-01', metric_column)
+    else:
+        pct_radius_scale = 200
+        pct_change_map = rmap.pct_change_map(rea.panel(), '2010-01-01', '2022-08-01')
+    merge_county_pct_change_df = pct_change_map['table']
 
     # Tooltip to display county data
     tooltip = {
-        "html": "County: {county}</br> State: {state}</br>  Pct Change: {cum_pct_ch}%</br> " +
-        "Latitude: {latitude} </br> Longitude: {longitude} </br> "
+        "html": "{name}</br> " + pct_metric + ": {value}%</br> "
     }
 
     # Define a layer to display on a map
     layer = pdk.Layer(
         "ScatterplotLayer",
-        merge_county_pct_change_df,
+        pct_change_map[pct_level.lower()],
         pickable=True,
         opacity=0.8,
         stroked=True,
         filled=True,
-        radius_scale=200,
+        radius_scale=pct_radius_scale if pct_level == 'County' else 5 * pct_radius_scale,
         radius_min_pixels=1,
         radius_max_pixels=100,
         line_width_min_pixels=1,
-        get_position='[longitude, latitude]',
-        get_radius="cum_pct_ch",
+        get_position='position',
+        # Losses and drawdowns are negative; size the circle by magnitude
+        get_radius="value < 0 ? -value : value",
         get_fill_color=[255, 140, 0],
         get_line_color=[0, 0, 0],
     )
@@ -201,13 +173,18 @@ with pct_change_sales:
     col1, col2 = st.columns((3, 1))
     
     # Rendering map to column1
-    col1.write(r)
+    with ins.timed('pydeck render'):
+        col1.write(r)
    
     # Displaying dataframe to column 2
     col2.dataframe(merge_county_pct_change_df, 1000, 700)
 
 # Format MACD container
-with macd_container:
+with macd_container, ins.timed('MAC/D'):
+    # For the MACD charts
+    import holoviews as hv
+    import hvplot.pandas
+
     # Adding subheader
     st.subheader("MAC/D")
     
@@ -227,35 +204,26 @@ with macd_container:
     slow = int(slow)
     signal = int(signal)
 
-    # Creates a DataFrame using only the columns we are interested in
-    filtered_df = master_df[['date', 'county', 'state', 'value']]
-
-    # Merging state and county columns in dataframe
-    filtered_df['county'] = filtered_df['county'] + ", " + filtered_df['state']
-    drop_cols = ['state']
-    filtered_df = filtered_df.drop(columns=drop_cols)
-
-    # Figured out the change in number of counties was messing up the charts
-    exploratory_df = filtered_df.groupby('date').count()
-
-    # Create new DataFrame with summed county markets to represent the entire nation
-    nationwide_df = filtered_df.groupby(
-        filtered_df['date']).agg({'value': 'sum'})
+    # Nation and state sums and averages of home values are precomputed in the
+    # rollup cube, so switching the aggregation level is a lookup
+    rollup = rea.rollup()
+    aggregation = st.selectbox('Aggregation', ['Nationwide'] + rollup.keys('state'))
 
-    # Must divide 'values' by number of counties that make up said value so data isn't skewed by county number
-    nationwide_df['avg'] = nationwide_df['value']/exploratory_df['county']
-
-    # Use Nationwide MACD funtion
-    nationwide_macd_df = macd.get_nationwide_macd(
-        nationwide_df, fast, slow, signal)
+    if aggregation == 'Nationwide':
+        # Use Nationwide MACD funtion
+        nationwide_macd_df = macd.get_nationwide_macd(rollup, fast, slow, signal)
+        title = 'US Housing Market Momentum'
+    else:
+        nationwide_macd_df = macd.get_state_macd(rollup, aggregation, fast, slow, signal)
+        title = f'{aggregation} Housing Market Momentum'
 
     # Graphing MACD
     plotting_macd = nationwide_macd_df.hvplot(
-        title='US Housing Market Momentum', ylabel='Momentum')
+        title=title, ylabel='Momentum')
     st.write(hv.render(plotting_macd, backend='bokeh'))
 
     # Creating new dataframe to hold list of unique counties
-    county_list = filtered_df['county'].unique()
+    county_list = rea.county_list()
 
     # Setting columns
     col1, col2 = st.columns(2)
@@ -266,7 +234,7 @@ with macd_container:
 
     # Use County MACD
     county_macd_df = macd.get_county_macd(
-        filtered_df, county, fast, slow, signal)
+        rea.panel(), county, fast, slow, signal)
 
     # Display the county user selected
     st.write('You selected:', county)
@@ -278,12 +246,34 @@ with macd_container:
     # Display map of MACD user selection
     col1.write(hv.render(plotting_county_macd, backend='bokeh'))
 
+    # Momentum screener across every county, using the same EMA lengths
+    st.subheader("Momentum Screener")
+
+    # Setting columns
+    col1, col2, col3, col4 = st.columns(4)
+
+    # Screener filters
+    crossover = col1.selectbox('Last crossover', ['bullish', 'bearish', 'any'])
+    max_age = col2.number_input('Crossover within (months)', 0, 120, 3)
+    sort_by = col3.selectbox('Rank by', ['histogram', 'histogram_pct', 'macd'])
+    top_n = col4.number_input('Number of counties', 1, 500, 25)
+
+    # Rank the counties by MACD histogram
+    screener_df = macd.screen_momentum(
+        rea.panel(), fast, slow, signal, top_n=int(top_n), sort_by=sort_by,
+        crossover=None if crossover == 'any' else crossover,
+        max_age=None if crossover == 'any' else int(max_age),
+        ascending=crossover == 'bearish')
+
+    # Display screener results
+    st.dataframe(screener_df)
+
 # Setting up monte carlo container
-with montecarlo:
+with montecarlo, ins.timed('Monte Carlo'):
     st.header("Monte Carlo Simulations")
     
     # Create box to select county
-    monte_carlo_county_list = filtered_df['county'].unique()
+    monte_carlo_county_list = rea.county_list()
     options = st.multiselect(
         'Select county you would like to simulate',
         monte_carlo_county_list,
@@ -292,46 +282,63 @@ with montecarlo:
     # Set Simulation parameters
     start_date = '2015-01-31'
     end_date = '2022-06-30'
-    mc_df = filtered_df
-    monte_carlo_options = []
-    
-    # Using for loop to create new dataframe to hold only date and county values
-    for group_loc in options:
-        df_temp = mc_df.loc[(mc_df['county'] == group_loc) & (
-            mc_df['date'] <= end_date) & (mc_df['date'] >= start_date)]
-        monte_carlo_options.append(
-            df_temp.drop('county', axis=1).reset_index())
-
-    try:
-        #creating dataframe for monte carlo and adding each item selected by user to the dataframe
-        monte_carlo_df = pd.concat(monte_carlo_options, axis=1, keys=options)
+    num_simulations = 1000
+    horizon = 120
+
+    if not options:
+        st.write("Please select options")
+    else:
+        # Simulations run in the background and are kept per county set and
+        # parameters, so selecting the same counties again shows the earlier result
+        job = rjobs.find_monte_carlo(
+            rea.panel(), options, start_date, end_date, num_simulations, horizon)
         calculate_monte_carlo_results = st.button("Get Monte Carlo Results")
         #if user clicks button to calculate results, the following code is executed
         if calculate_monte_carlo_results:
-            #initialize monte carlo simulation based on values added 
-            mc_sim = MCSimulation(monte_carlo_df, "", 1000, 120)
-            #calculate the cumulative returns
-            plt_sim = mc_sim.calc_cumulative_return()
-            st.write("Cumulative Returns")
-            st.write(plt_sim)
+            job = rjobs.submit_monte_carlo(
+                rea.panel(), options, start_date, end_date, num_simulations, horizon)
+        if job is not None:
+            # Follow the job's progress.  Changing a widget reruns the script and
+            # ends this loop, but the simulation keeps running in the background.
+            progress_bar = st.progress(job.fraction)
+            while not job.finished:
+                time.sleep(0.2)
+                progress_bar.progress(job.fraction)
+            progress_bar.empty()
+
+            mc_sim = job.result()
+            import matplotlib.pyplot as plt
+
+            # The simulation precomputes percentile bands, a few sample paths and
+            # the histogram of final returns, so the charts stay the same size
+            # whatever the number of simulations
+            st.write("Cumulative Returns (percentiles and sample paths)")
+            st.write(mc_sim.fan_chart)
             #plot expected returns over a period of time as a line chart
             st.write("120 Month Monte Carlo Sim(PCT Return)")
-            st.line_chart(plt_sim)
-            #preparing data for the histogram 
-            hist_data_arr = np.array(plt_sim.iloc[-1, :])
-            #plotting histogram
+            st.line_chart(mc_sim.fan_chart)
+            #plotting the precomputed histogram
+            histogram = mc_sim.final_histogram
             fig, ax = plt.subplots()
-            ax.hist(hist_data_arr, bins=10)
-            confidence_interval = plt_sim.iloc[-1,
-                                               :].quantile(q=[0.025, 0.975])
+            ax.bar(histogram['lower'], histogram['density'],
+                   width=histogram['upper'] - histogram['lower'], align='edge')
+            ax.set_title("Plot Distribution")
             #adding lines for confidence intervals
-            fig.add_artist(plt_sim.iloc[-1, :].plot(kind='hist', bins=10, density=True,
-                           title="Plot Distribution").axvline(confidence_interval.iloc[0], color='red'))
-            fig.add_artist(plt_sim.iloc[-1, :].plot(kind='hist', bins=10,
-                           density=True).axvline(confidence_interval.iloc[1], color='red'))
+            ax.axvline(mc_sim.confidence_interval.iloc[0], color='red')
+            ax.axvline(mc_sim.confidence_interval.iloc[1], color='red')
             st.pyplot(fig)
             #Summarizing the results
             st.write("Cumulative Returns Summary over the next 10 years")
             st.write(mc_sim.summarize_cumulative_return())
-    except:
-        st.write("Please select options")
+
+# Report how much load time the process-wide memo saved this rerun
+rerun_report = rea.rerun_report()
+st.caption(f"Rerun took {rerun_report['elapsed_seconds']:.2f}s; "
+           f"cached data saved {rerun_report['saved_seconds']:.2f}s of loading.")
+
+# Hidden debug panel with the per-section and per-function timings of this rerun
+if ins.ENABLED:
+    with st.expander("Performance (debug)"):
+        st.dataframe(ins.rerun_summary())
+        st.dataframe(ins.rerun_records())
+        st.dataframe(rea.memo_report())
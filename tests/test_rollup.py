@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from realestate_panel import ValuePanel
+from realestate_rollup import RollupCube
+
+
+def master_df(n_months=12, seed=0):
+    # Four counties in two states
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-31', periods=n_months, freq='M')
+    regions = pd.DataFrame({'region_id': [1, 2, 3, 4], 'state': ['CA', 'CA', 'TX', 'TX']})
+    regions['county'] = 'County ' + regions['region_id'].astype(str)
+    df = regions.merge(pd.DataFrame({'date': dates}), how='cross')
+    df['value'] = rng.uniform(1e5, 5e5, len(df))
+    return df
+
+
+def assert_same_cube(cube, expected):
+    for level in ['nation', 'state']:
+        np.testing.assert_array_equal(cube.counts[level], expected.counts[level])
+        np.testing.assert_allclose(cube.sums[level], expected.sums[level], rtol=1e-12)
+
+
+def test_extend_adds_new_months():
+    full = master_df()
+    old = ValuePanel.from_frame(full[full['date'] < '2020-10-01'])
+    new = ValuePanel.from_frame(full)
+    assert_same_cube(RollupCube.from_panel(old).extend(new), RollupCube.from_panel(new))
+
+
+def test_extend_recomputes_back_filled_months():
+    # County 4 was three months behind; the sync back-fills it in months the
+    # cube already holds, along with the new month of every county
+    synced = master_df()
+    behind = synced[(synced['date'] < '2020-12-01')
+                    & ~((synced['region_id'] == 4) & (synced['date'] > '2020-08-31'))]
+    old = ValuePanel.from_frame(behind)
+    new = ValuePanel.from_frame(synced)
+
+    cube = RollupCube.from_panel(old).extend(new)
+    assert_same_cube(cube, RollupCube.from_panel(new))
+    np.testing.assert_array_equal(cube.counts['nation'][0, -4:], [4, 4, 4, 4])
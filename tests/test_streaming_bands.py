@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MCForecastTools import MCSimulation
+
+QUANTILES = [0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975]
+
+
+def portfolio_input(n_counties=3, n_months=90, seed=0):
+    # Random-walk home values with a (county, column) MultiIndex on the columns
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2015-01-31', periods=n_months, freq='M')
+    frames = {}
+    for county in range(n_counties):
+        returns = rng.normal(0.004, 0.01, n_months)
+        frames[county] = pd.DataFrame({'date': dates, 'value': 2e5 * np.cumprod(1 + returns)})
+    return pd.concat(frames, axis=1)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 1000])
+def test_streaming_bands_match_exact_bands(chunk_size):
+    monte_carlo_df = portfolio_input()
+    options = dict(num_simulations=2000, trading_months=60, seed=5, chunk_size=chunk_size)
+
+    exact = MCSimulation(monte_carlo_df, "", **options)
+    paths = exact.calc_cumulative_return().to_numpy()
+    exact_bands = np.quantile(paths, QUANTILES, axis=1).T
+
+    streaming = MCSimulation(monte_carlo_df, "", streaming=True, **options)
+    streaming.calc_cumulative_return()
+    bands = streaming.percentile_bands[QUANTILES].to_numpy()
+
+    # Same draws either way, so only the histogram binning differs; before the
+    # histogram could grow, chunk_size=1 was off by a third of the spread
+    spread = exact_bands[:, -1] - exact_bands[:, 0]
+    assert np.all(np.abs(bands - exact_bands) <= 0.02 * spread[:, None] + 1e-12)
+    np.testing.assert_array_equal(streaming.final_returns.to_numpy(), paths[-1])
+
+
+@pytest.mark.parametrize('chunk_size', [0, -5, 2.5])
+def test_invalid_chunk_size(chunk_size):
+    with pytest.raises(ValueError):
+        MCSimulation(portfolio_input(), "", chunk_size=chunk_size)
+
+
+def test_antithetic_pairs_span_chunks():
+    simulation = MCSimulation(portfolio_input(), "", num_simulations=40, trading_months=12, seed=1,
+                              sampling='antithetic', chunk_size=8)
+    paths = simulation.calc_cumulative_return().to_numpy()
+    returns = paths[1:] / paths[:-1] - 1
+    mean = simulation._simulation_params()['mean_returns'].mean()
+    # Every pair mirrors the portfolio mean, including pairs at chunk edges
+    np.testing.assert_allclose(returns[:, 0::2] + returns[:, 1::2], 2 * mean, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        MCSimulation(portfolio_input(), "", sampling='antithetic', chunk_size=7)